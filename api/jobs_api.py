@@ -0,0 +1,48 @@
+# backend/api/jobs_api.py
+import json
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from backend.services.job_services import JobManager
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+# /texts/load、/subtitles/load 的 background 模式共用同一个任务队列
+jobs = JobManager()
+
+
+@router.on_event("shutdown")
+def shutdown_event():
+    jobs.shutdown()
+
+
+@router.get("/{job_id}")
+def get_job(job_id: str):
+    """
+    查询任务状态：status 为 queued / running / done / error，
+    progress 含 stage、bytes_read / bytes_total、paragraphs_cleaned / paragraphs_total 等
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return job
+
+
+def _events(job: dict):
+    """每次进度变化推一条 SSE，任务结束后关闭"""
+    while True:
+        yield f"data: {json.dumps(job, ensure_ascii=False)}\n\n"
+        if job["status"] in ("done", "error"):
+            return
+        latest = jobs.wait(job["id"], job["version"])
+        if latest is None:
+            return
+        job = latest
+
+
+@router.get("/{job_id}/stream")
+def stream_job(job_id: str):
+    """以 Server-Sent Events 推送任务进度，代替轮询"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return StreamingResponse(_events(job), media_type="text/event-stream")
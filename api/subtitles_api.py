@@ -1,14 +1,35 @@
 # ✅ app/api/subtitles_services.py
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, HTTPException, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
-from backend.services.subtitles_services import SubtitleManager 
+from backend.services.subtitles_services import PlaybackClock, SubtitleManager, SubtitleRegistry
+from backend.services.tokenize_services import word_key
+from backend.api.jobs_api import jobs
+# 与 /words 共用同一个实例（连接池）
+from backend.api.words_api import db as words_db
+import asyncio
+import json
+import math
 import os
 
 router = APIRouter(prefix="/subtitles")
-manager = SubtitleManager()
+# 多个会话各自的字幕轨道；查询接口不带 track_id 时使用最近加载的轨道
+registry = SubtitleRegistry()
+_empty = SubtitleManager()
+
+
+def _track(track_id):
+    """取字幕轨道；指定的 track_id 不存在（未加载或已被淘汰）时返回 404"""
+    manager = registry.get(track_id)
+    if manager is None:
+        if track_id:
+            raise HTTPException(status_code=404, detail="字幕轨道不存在或已被淘汰，请重新加载")
+        return _empty
+    return manager
+
 
 class SubtitlePath(BaseModel):
     file_path: str
+    background: bool = False  # True：立即返回 job_id，用 /jobs/{id} 查询进度
 
 @router.post("/load")
 def load_subtitles(data: SubtitlePath):
@@ -17,10 +38,15 @@ def load_subtitles(data: SubtitlePath):
     if not os.path.isfile(subtitle_path):
         return {"status": "error", "message": "File not found"}
 
+    if data.background:
+        job = jobs.submit("subtitles.load", _load_job, subtitle_path)
+        return {"status": "queued", "job_id": job["id"]}
+
     try:
-        manager.load_subtitle(subtitle_path)
+        track_id, manager = registry.load(subtitle_path)
         return {
             "status": "loaded",
+            "track_id": track_id,
             "count": len(manager.subtitles),
             "paragraphs": [s.content for s in manager.subtitles]
         }
@@ -28,9 +54,18 @@ def load_subtitles(data: SubtitlePath):
         return {"status": "error", "message": str(e)}
 
 
+def _load_job(subtitle_path, progress):
+    track_id, manager = registry.load(subtitle_path, progress=progress, executor=jobs.cpu_executor)
+    return {
+        "track_id": track_id,
+        "count": len(manager.subtitles),
+        "paragraphs": [s.content for s in manager.subtitles]
+    }
+
+
 @router.get("/at")
-def get_subtitle_at(position_ms: int = Query(...)):
-    sub = manager.get_subtitle_at(position_ms)
+def get_subtitle_at(position_ms: int = Query(...), track_id: str | None = Query(None)):
+    sub = _track(track_id).get_subtitle_at(position_ms)
     if sub:
         return {
             "start_time": sub.start_time,
@@ -40,6 +75,195 @@ def get_subtitle_at(position_ms: int = Query(...)):
     else:
         return {"status": "no_subtitle"}
 
+@router.get("/window")
+def get_subtitle_window(
+    position_ms: int = Query(...),
+    duration_ms: int = Query(30000, ge=0, le=600000),
+    track_id: str | None = Query(None),
+):
+    """
+    返回 [position_ms, position_ms + duration_ms] 内的字幕，供播放器预取，代替高频轮询 /at；
+    next_start 为窗口之后下一条字幕的开始时间（没有则为 null），播到附近再取下一个窗口
+    """
+    manager = _track(track_id)
+    end_ms = position_ms + duration_ms
+    cues = manager.get_range(position_ms, end_ms)
+    following = manager.next_cue_after(end_ms)
+    return {
+        "start_ms": position_ms,
+        "end_ms": end_ms,
+        "cues": [
+            {
+                "start_time": sub.start_time,
+                "end_time": sub.end_time,
+                "content": sub.content
+            }
+            for sub in cues
+        ],
+        "next_start": following.start_time if following else None,
+    }
+
 @router.get("/status")
-def subtitle_status():
-    return {"loaded": manager.has_subtitles()}
\ No newline at end of file
+def subtitle_status(track_id: str | None = Query(None)):
+    manager = registry.get(track_id)
+    return {"loaded": manager is not None and manager.has_subtitles()}
+
+
+@router.get("/search")
+def search_word(word: str = Query(..., min_length=1), track_id: str | None = Query(None)):
+    """
+    包含某个单词的全部字幕（查倒排表，不扫描字幕内容）；
+    spans 为该词在 content 中的 [start, end) 字符下标，可直接用于高亮
+    """
+    manager = _track(track_id)
+    return {
+        "word": word_key(word),
+        "cues": [
+            {
+                "index": i,
+                "start_time": sub.start_time,
+                "end_time": sub.end_time,
+                "content": sub.content,
+                "spans": [list(span) for span in spans],
+            }
+            for i, sub, spans in manager.find_word(word)
+        ],
+    }
+
+
+@router.get("/density")
+def unknown_density(
+    user_id: int = Query(...),
+    lang: str = Query("en"),
+    track_id: str | None = Query(None),
+):
+    """
+    每条字幕的生词密度：生词本里没有或熟悉度为 0 的词算生词。
+    字幕词表和生词本的 word_norm 用同一个 word_key 归一化（大小写、NFC、弯撇号），
+    已认识的 Über / don’t 不会被算成生词。
+    density = 生词出现次数 / 词数，词数为 0 时记 0
+    """
+    manager = _track(track_id)
+    levels = words_db.get_levels(user_id, manager.vocabulary(), lang)
+    return [
+        {
+            "index": i,
+            "start_time": manager.subtitles[i].start_time,
+            "end_time": manager.subtitles[i].end_time,
+            "tokens": total,
+            "unknown": unknown_count,
+            "unknown_words": unknown,
+            "density": round(unknown_count / total, 4) if total else 0.0,
+        }
+        for i, total, unknown_count, unknown in manager.unknown_density(levels)
+    ]
+
+
+@router.get("/tracks")
+def subtitle_tracks():
+    """已登记的轨道数、估算内存占用与预算"""
+    return registry.stats()
+
+
+def _cue_event(sub):
+    return {
+        "type": "cue",
+        "cue": {
+            "start_time": sub.start_time,
+            "end_time": sub.end_time,
+            "content": sub.content
+        } if sub else None,
+    }
+
+
+def _parse_control(text):
+    """
+    解析一条控制消息，返回 (type, position_ms, rate)，未给出的字段为 None；
+    不是 JSON 对象、类型未知、position_ms 不是整数或 rate 不是正数时抛 ValueError
+    """
+    msg = json.loads(text)
+    if not isinstance(msg, dict):
+        raise ValueError("控制消息必须是 JSON 对象")
+    kind = msg.get("type")
+    if kind not in ("play", "pause", "seek", "rate", "position"):
+        raise ValueError(f"未知消息类型: {kind}")
+    position_ms = msg.get("position_ms")
+    if position_ms is not None:
+        position_ms = int(position_ms)
+    rate = msg.get("rate")
+    if rate is not None:
+        rate = float(rate)
+        if not (0 < rate < math.inf):
+            raise ValueError("rate 必须是正数")
+    return kind, position_ms, rate
+
+
+async def _read_controls(websocket: WebSocket, clock: PlaybackClock, changed: asyncio.Event):
+    """
+    读取客户端的播放控制消息并更新时钟：
+    {"type": "play" | "pause" | "seek" | "rate" | "position", "position_ms": ..., "rate": ...}
+    position 为定期校准，字段都可省略。格式不对的消息回一条 {"type": "error"}，连接保持
+    """
+    while True:
+        try:
+            kind, position_ms, rate = _parse_control(await websocket.receive_text())
+        except KeyError:
+            # 二进制帧没有 text
+            await websocket.send_json({"type": "error", "message": "只接受 JSON 文本帧"})
+            continue
+        except (ValueError, TypeError, OverflowError) as e:
+            # JSON 解析错误也是 ValueError
+            await websocket.send_json({"type": "error", "message": f"无效的控制消息: {e}"})
+            continue
+        if kind == "play":
+            clock.update(position_ms, rate, paused=False)
+        elif kind == "pause":
+            clock.update(position_ms, rate, paused=True)
+        else:
+            clock.update(position_ms, rate)
+        changed.set()
+
+
+@router.websocket("/ws")
+async def subtitle_stream(websocket: WebSocket, track_id: str | None = Query(None)):
+    """
+    推送当前字幕，代替高频轮询 /at：客户端只在播放、暂停、跳转、变速时发控制消息，
+    服务端按速率推算播放位置，睡到下一个字幕边界再检查，只有当前字幕变化时才推送
+    {"type": "cue", "cue": {start_time, end_time, content} | null}
+    必须带 track_id（不回退到最近加载的轨道，那可能是别人的），不存在时以 4404 关闭
+    """
+    await websocket.accept()
+    manager = registry.get(track_id) if track_id else None
+    if manager is None:
+        await websocket.close(code=4404, reason="subtitle track not found")
+        return
+
+    clock = PlaybackClock()
+    changed = asyncio.Event()
+    reader = asyncio.create_task(_read_controls(websocket, clock, changed))
+    sent = False
+    current = None
+    try:
+        while not reader.done():
+            # 先清标记再读时钟：发送期间收到的控制消息会让下面的等待立即返回
+            changed.clear()
+            position = clock.position()
+            sub = manager.get_subtitle_at(position)
+            if not sent or sub is not current:
+                await websocket.send_json(_cue_event(sub))
+                sent, current = True, sub
+
+            boundary = manager.next_change_after(position)
+            timeout = clock.seconds_until(boundary) if boundary is not None else None
+            waiter = asyncio.create_task(changed.wait())
+            await asyncio.wait({reader, waiter}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if reader.done():
+            error = reader.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                print(f"字幕推送连接异常: {error}")
+        else:
+            reader.cancel()
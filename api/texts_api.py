@@ -2,6 +2,11 @@
 from fastapi import APIRouter, Query, HTTPException
 from pydantic import BaseModel
 from backend.services.text_services import TextManager
+from backend.services.tokenize_services import tokenize, unique_keys
+# 与 /words、/translation 共用同一个实例（连接池、查词缓存）
+from backend.api.words_api import db as words_db
+from backend.api.translation_api import translator
+from backend.api.jobs_api import jobs
 
 router = APIRouter(prefix="/texts", tags=["texts"])
 tm = TextManager()
@@ -9,15 +14,21 @@ tm = TextManager()
 # ---------- 输入模型 ----------
 class FileIn(BaseModel):
     file_path: str
+    lazy: bool | None = None  # None：按文件大小自动选择惰性模式
+    background: bool = False  # True：立即返回 job_id，用 /jobs/{id} 查询进度
 
 # ---------- 路由 ----------
 @router.post("/load")
 def load_text(payload: FileIn):
     """
-    加载 TXT 文件到内存，返回文本元信息
+    加载 TXT 文件到内存，返回文本元信息；
+    background 为 True 时放入后台任务，返回 job_id，任务结果即文本元信息
     """
+    if payload.background:
+        job = jobs.submit("texts.load", _load_job, payload.file_path, payload.lazy)
+        return {"status": "queued", "job_id": job["id"]}
     try:
-        t = tm.load_txt(payload.file_path)
+        t = tm.load_txt(payload.file_path, lazy=payload.lazy)
         return {
             "status": "ok",
             "info": tm.info(t.id),
@@ -26,6 +37,11 @@ def load_text(payload: FileIn):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def _load_job(file_path: str, lazy: bool | None, progress):
+    t = tm.load_txt(file_path, lazy=lazy, progress=progress, executor=jobs.cpu_executor)
+    return tm.info(t.id)
+
+
 @router.get("/list")
 def list_texts():
     """列出当前已缓存的全部文本 (id, title)"""
@@ -45,3 +61,69 @@ def get_content(
         return tm.get_slice(text_id, start_para, limit)
     except KeyError as e:
         raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/sentences")
+def get_sentences(
+    text_id: int = Query(..., description="load 接口返回的 id"),
+    start_para: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """
+    按段返回句子切分：[{index, text, sentences: [[start, end], ...]}]，
+    start/end 为句子在该段 text 中的字符偏移
+    """
+    try:
+        return tm.get_sentences(text_id, start_para, limit)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/annotated")
+def get_annotated(
+    text_id: int = Query(..., description="load 接口返回的 id"),
+    user_id: int = Query(...),
+    start_para: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    lang: str = Query("en"),
+    with_dict: bool = Query(False, description="是否附带词典释义摘要"),
+):
+    """
+    一次返回切片段落 + 分词 + 用户熟悉度，代替 content → 客户端分词 → 逐词查询。
+    tokens 为 [start, end, level]，start/end 是段内 Unicode 码点下标，level 为 null 表示不在生词本中；
+    单词本身用 text[start:end].toLowerCase() 取得，与 dict 的键一致。
+    """
+    try:
+        paragraphs = tm.get_slice(text_id, start_para, limit)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    token_lists = [tokenize(p) for p in paragraphs]
+    keys = unique_keys(token_lists)
+    levels = words_db.get_levels(user_id, keys, lang)
+
+    result = {
+        "text_id": text_id,
+        "start_para": start_para,
+        "paragraphs": [
+            {
+                "index": start_para + i,
+                "text": para,
+                "tokens": [[start, end, levels.get(key)] for start, end, key in tokens],
+            }
+            for i, (para, tokens) in enumerate(zip(paragraphs, token_lists))
+        ],
+    }
+    if with_dict:
+        entries = translator.lookup_words(keys)
+        result["dict"] = {
+            key: {
+                "word": entry["word"],
+                "phonetic": entry["phonetic"],
+                "translation": entry["translation"],
+                **({"lemma": entry["lemma"]} if "lemma" in entry else {}),
+            }
+            for key, entry in entries.items()
+            if "error" not in entry
+        }
+    return result
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Query, Body
 from typing import List
 from backend.services.translation_services import TranslationService
+import os
 
 router = APIRouter(prefix="/translation")
-translator = TranslationService()
+# DICT_ENGINE=snapshot 时使用 dict_build_services 生成的内存映射快照查词
+translator = TranslationService(engine=os.environ.get("DICT_ENGINE", "sqlite"))
 
 @router.get("/lookup")
 def lookup_word(word: str = Query(..., description="要查询的单词")):
@@ -11,14 +13,28 @@ def lookup_word(word: str = Query(..., description="要查询的单词")):
 
 @router.post("/batch_lookup")
 def batch_lookup_words(words: List[str] = Body(..., description="要查询的单词列表")):
+    found = translator.lookup_words([w for w in words if w and isinstance(w, str)])
     result = {}
     for w in words:
         if not w or not isinstance(w, str):
             result[w] = {"error": "无效的单词"}
             continue
-        result[w] = translator.lookup_word(w)
+        result[w] = found[w]
     return result
 
+@router.get("/suggest")
+def suggest_words(
+    q: str = Query(..., description="输入的前缀或拼错的单词"),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """前缀补全与拼写纠错"""
+    return translator.suggest(q, limit)
+
+@router.get("/cache_stats")
+def cache_stats():
+    """查词缓存的命中/未命中/淘汰计数，用于调整缓存容量"""
+    return translator.cache.stats()
+
 @router.get("/translate")
 def translate_sentence(q: str = Query(..., description="要翻译的句子")):
     return {"translation": translator.translate_sentence(q)}
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Query, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from backend.services.tts_services import TTSService
 import asyncio
 import time
@@ -65,9 +65,11 @@ async def text_to_speech(
     text: str = Query(...), 
     lang: str = Query("en"),
     speed: float = Query(1.0, ge=0.5, le=1.5),
+    stream: bool = Query(False, description="逐句合成并流式返回 MP3，第一句完成即可开始播放"),
 ):
     """
     文章TTS API - 原有功能，优化后用于处理较长文本
+    stream=true 时未命中缓存的文本边合成边返回，命中缓存仍直接返回文件
     """
     global tts_service, loading_task
     
@@ -79,6 +81,15 @@ async def text_to_speech(
             loading_task = asyncio.create_task(load_model_in_background())
             raise HTTPException(status_code=503, detail="TTS服务正在初始化")
     
+    if stream:
+        cached_path = await tts_service.get_cached_speech(text, lang, speed)
+        if cached_path:
+            return FileResponse(cached_path)
+        return StreamingResponse(
+            tts_service.speak_stream(text, lang, speed),
+            media_type="audio/mpeg",
+        )
+
     # 调用文章TTS方法
     audio_path = await tts_service.speak(text, lang, speed)
     if not audio_path:
@@ -1,6 +1,10 @@
-from fastapi import APIRouter, Query
+import csv
+import io
+import json
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from backend.services.db_words_services import UserWordDB
+from backend.services.db_words_services import EXPORT_COLUMNS, UserWordDB
 
 router = APIRouter(prefix="/words")
 db = UserWordDB("backend/data/user.db")
@@ -16,15 +20,88 @@ class LevelData(WordBase):
 class MeaningIn(WordBase):
     meaning: str
 
+class LevelItem(BaseModel):
+    word:  str
+    level: int  # 0–5
+
+class BatchLevelData(BaseModel):
+    user_id: int
+    lang:    str = "en"
+    items:   list[LevelItem]
+
 @router.get("")
-def get_words(user_id: int = Query(...), lang: str = Query("en")):
-    return db.get_all_words(user_id, lang)
+def get_words(
+    user_id: int = Query(...),
+    lang: str = Query("en"),
+    after_id: int | None = Query(None, ge=0, description="上一页返回的 next_cursor"),
+    limit: int | None = Query(None, ge=1, le=5000),
+):
+    """不带分页参数时返回全部单词（旧格式）；带 after_id / limit 时返回 {items, next_cursor}"""
+    if after_id is None and limit is None:
+        return db.get_all_words(user_id, lang)
+    return db.get_words_page(user_id, lang, after_id or 0, limit or 500)
+
+def _ndjson_lines(batches):
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+def _csv_lines(batches):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():  # 没有任何数据时也输出表头
+        yield buf.getvalue()
+
+@router.get("/export")
+def export_words(
+    user_id: int | None = Query(None, description="不传则导出全部用户"),
+    lang: str | None = Query(None, description="不传则导出全部语言"),
+    format: str = Query("ndjson"),
+):
+    """流式导出单词表（NDJSON 或 CSV），边读边发，内存占用不随词量增长"""
+    batches = db.iter_words(user_id, lang)
+    if format == "ndjson":
+        return StreamingResponse(_ndjson_lines(batches), media_type="application/x-ndjson")
+    if format == "csv":
+        return StreamingResponse(
+            _csv_lines(batches),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="user_words.csv"'},
+        )
+    raise HTTPException(status_code=400, detail="format 只支持 ndjson 或 csv")
+
+@router.get("/changes")
+def get_word_changes(user_id: int = Query(...), since: int = Query(0, ge=0), lang: str = Query("en")):
+    """增量同步：只返回修订号 since 之后新增、修改、删除的单词，以及新的修订号"""
+    return db.get_changes(user_id, since, lang)
+
+@router.delete("")
+def delete_word(user_id: int = Query(...), word: str = Query(...), lang: str = Query("en")):
+    if db.delete_word(user_id, word, lang):
+        return {"status": "deleted"}
+    return {"error": "Word not found"}
 
 @router.post("/familiarity")
 def update_level(data: LevelData):
     db.update_word_level(data.user_id, data.word, data.level, data.lang)
     return {"status": "updated"}
 
+@router.post("/familiarity/batch")
+def update_levels(data: BatchLevelData):
+    """一次请求、一个事务批量标记熟悉度，逐词返回 inserted / updated / invalid"""
+    results = db.update_word_levels(
+        data.user_id, [(item.word, item.level) for item in data.items], data.lang
+    )
+    return {"status": "ok", "results": results}
+
 @router.post("/meaning")
 def save_meaning(data: MeaningIn):
     db.update_user_meaning(data.user_id, data.word, data.meaning, data.lang)
@@ -0,0 +1,56 @@
+# backend/services/clean_services.py
+"""
+段落清洗引擎，TextManager 与 SubtitleManager 共用。
+
+结果与原先的多遍正则 + 逐字符 unicodedata.category 过滤逐字节一致：
+1. 连续空白折叠为 1 个空格并去掉首尾空白（str.split() 与正则 \\s 用的是同一套空白定义）
+2. 删除 Unicode 类别为 S* / C* 的字符（原先单独删除的 ASCII 控制字符都属于 Cc，已包含在内）
+两步顺序不能交换：原实现先折叠再删字符，"a \\x01 b" 得到的是 "a  b"（两个空格）。
+
+第 2 步不再逐字符调用 unicodedata：先用 set(text) 取出文本里出现过的不同字符，
+查一张按需增长的“保留 / 删除”分类表，再用只含这些待删字符的小字符类正则一次删掉。
+覆盖全部 S* / C* 码点的大字符类（含全部未分配码点）匹配反而更慢。
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Iterable, List
+
+# 批量清洗时的段落分隔符（U+2029，类别 Zp）：不会被第 2 步删除，第 1 步之后段落内也不会再出现
+_JOIN = "\u2029"
+
+# 已分类的字符；只增不减，多线程下重复分类同一字符也无妨
+_KEEP = set()
+_DROP = set()
+
+
+def _to_drop(text: str) -> str:
+    """text 中出现的、需要删除的字符（排序后拼成字符串，便于缓存正则）"""
+    chars = set(text)
+    unknown = chars - _KEEP - _DROP
+    for ch in unknown:
+        (_DROP if unicodedata.category(ch)[0] in "SC" else _KEEP).add(ch)
+    return "".join(sorted(chars & _DROP))
+
+
+@lru_cache(maxsize=1024)
+def _drop_re(chars: str) -> "re.Pattern":
+    return re.compile("[" + re.escape(chars) + "]+")
+
+
+def _drop(text: str) -> str:
+    chars = _to_drop(text)
+    return _drop_re(chars).sub("", text) if chars else text
+
+
+def clean_text(text: str) -> str:
+    """清洗单段文本"""
+    return _drop(" ".join(text.split()))
+
+
+def clean_paragraphs(paragraphs: Iterable[str]) -> List[str]:
+    """批量清洗：每段先折叠空白，再拼在一起一次性删除 S* / C* 字符"""
+    collapsed = [" ".join(p.split()) for p in paragraphs]
+    if not collapsed:
+        return []
+    return _drop(_JOIN.join(collapsed)).split(_JOIN)
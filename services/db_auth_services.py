@@ -1,12 +1,14 @@
-import sqlite3
+from .db_pool_services import SQLitePool
 
 class AuthDB:
-    def __init__(self, db_path):
+    def __init__(self, db_path, pool: SQLitePool | None = None):
         self.db_path = db_path
+        # 每线程一条长连接（WAL 模式），可与同库的 UserWordDB 共用
+        self._pool = pool or SQLitePool.read_write(db_path)
         self.init_database()
 
     def init_database(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS users (
@@ -15,27 +17,22 @@ class AuthDB:
                     password TEXT
                 )
             ''')
-            conn.commit()
 
     def get_user_id(self, username: str) -> int:
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
-            row = cursor.fetchone()
-            return row[0] if row else None
+        conn = self._pool.connection()
+        cursor = conn.execute("SELECT id FROM users WHERE username = ?", (username,))
+        row = cursor.fetchone()
+        return row[0] if row else None
 
     def add_user(self, username: str, password: str):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, password))
-            conn.commit()
+        with self._pool.connection() as conn:
+            conn.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, password))
 
     def get_user(self, user_id: int) -> dict | None:
         """新增：按 user_id 获取完整用户信息"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, username FROM users WHERE id = ?", (user_id,))
-            row = cursor.fetchone()
-            if row:
-                return {"id": row[0], "username": row[1]}
-            return None
+        conn = self._pool.connection()
+        cursor = conn.execute("SELECT id, username FROM users WHERE id = ?", (user_id,))
+        row = cursor.fetchone()
+        if row:
+            return {"id": row[0], "username": row[1]}
+        return None
@@ -0,0 +1,91 @@
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class SQLitePool:
+    """
+    按线程复用的 SQLite 连接池。
+
+    sqlite3 连接不能安全地在线程间共享，而 FastAPI 的同步路由跑在线程池里，
+    所以这里给每个工作线程各开一条长连接：首次使用时打开并执行 PRAGMA，之后一直复用。
+    """
+
+    def __init__(self, database, *, uri=False, pragmas=None,
+                 timeout=5.0, cached_statements=256, isolation_level=""):
+        self.database = database
+        self.uri = uri
+        self.pragmas = list(pragmas or [])
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.isolation_level = isolation_level
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = []
+        self._generation = 0
+
+    @classmethod
+    def read_only(cls, db_path, *, mmap_size=256 * 1024 * 1024, cache_kib=64 * 1024):
+        """
+        只读 + immutable 打开只读数据文件（如 ECDICT 的 en.db）。
+        immutable 让 SQLite 跳过文件锁和变更检测，适合运行期间不会被改写的词典。
+        """
+        database = Path(db_path).resolve().as_uri() + "?mode=ro&immutable=1"
+        return cls(database, uri=True, pragmas=[
+            "PRAGMA query_only = ON",
+            f"PRAGMA mmap_size = {int(mmap_size)}",
+            f"PRAGMA cache_size = -{int(cache_kib)}",
+            "PRAGMA temp_store = MEMORY",
+        ])
+
+    @classmethod
+    def read_write(cls, db_path, *, busy_timeout=5.0, cache_kib=16 * 1024):
+        """
+        读写库（如 user.db）：WAL 让读写互不阻塞，synchronous=NORMAL 在 WAL 下仍保证一致性，
+        busy_timeout 让并发写入排队等待而不是直接报 database is locked。
+        """
+        return cls(db_path, timeout=busy_timeout, pragmas=[
+            "PRAGMA journal_mode = WAL",
+            "PRAGMA synchronous = NORMAL",
+            f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}",
+            f"PRAGMA cache_size = -{int(cache_kib)}",
+        ])
+
+    def connection(self) -> sqlite3.Connection:
+        """返回当前线程的连接，没有则新建"""
+        local = self._local
+        conn = getattr(local, "conn", None)
+        if conn is not None and local.generation == self._generation:
+            return conn
+
+        conn = sqlite3.connect(
+            self.database,
+            uri=self.uri,
+            timeout=self.timeout,
+            cached_statements=self.cached_statements,
+            isolation_level=self.isolation_level,
+            check_same_thread=False,  # 仅为了 close_all 能跨线程关闭；使用上仍是一线程一连接
+        )
+        try:
+            for pragma in self.pragmas:
+                conn.execute(pragma)
+        except Exception:
+            conn.close()
+            raise
+
+        with self._lock:
+            self._conns.append(conn)
+            local.conn = conn
+            local.generation = self._generation
+        return conn
+
+    def close_all(self):
+        """关闭所有线程的连接；之后各线程再次使用时会重新打开"""
+        with self._lock:
+            conns, self._conns = self._conns, []
+            self._generation += 1
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
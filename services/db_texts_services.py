@@ -0,0 +1,144 @@
+from .db_pool_services import SQLitePool
+
+
+class TextDB:
+    """
+    已加载文本的持久化存储（按文件内容哈希去重），多个 worker / 重启后共享同一份书库。
+
+    - texts           : 每份内容一行，id 即对外的 text_id，跨进程、跨重启稳定
+    - text_paragraphs : 清洗后的段落及其在解码文本中的 [start, end) 字符偏移
+    - text_paths      : 路径 → (size, mtime_ns, text_id)，重复加载同一文件时只需一次 stat
+
+    惰性模式（lazy = 1）的超大文本不存段落，只记元信息，段落按需从源文件读取；
+    其 paragraph_count 在整个文件扫描完之前为 NULL。
+    """
+
+    def __init__(self, db_path, pool: SQLitePool | None = None):
+        self.db_path = db_path
+        self._pool = pool or SQLitePool.read_write(db_path)
+        self.init_database()
+
+    def init_database(self):
+        with self._pool.connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS texts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    content_hash TEXT NOT NULL UNIQUE,
+                    title TEXT,
+                    path TEXT,
+                    encoding TEXT,
+                    size INTEGER,
+                    paragraph_count INTEGER,
+                    lazy INTEGER NOT NULL DEFAULT 0,
+                    added_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS text_paragraphs (
+                    text_id INTEGER NOT NULL,
+                    idx INTEGER NOT NULL,
+                    start_offset INTEGER,
+                    end_offset INTEGER,
+                    content TEXT,
+                    PRIMARY KEY (text_id, idx)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS text_paths (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    text_id INTEGER NOT NULL
+                )
+            ''')
+
+    def find_by_path(self, path: str, size: int, mtime_ns: int) -> int | None:
+        """文件大小和修改时间都没变时直接返回上次的 text_id"""
+        conn = self._pool.connection()
+        row = conn.execute('''
+            SELECT p.text_id FROM text_paths AS p
+              JOIN texts AS t ON t.id = p.text_id
+             WHERE p.path = ? AND p.size = ? AND p.mtime_ns = ?
+        ''', (path, size, mtime_ns)).fetchone()
+        return row[0] if row else None
+
+    def find_by_hash(self, content_hash: str) -> int | None:
+        conn = self._pool.connection()
+        row = conn.execute(
+            "SELECT id FROM texts WHERE content_hash = ?", (content_hash,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def remember_path(self, path: str, size: int, mtime_ns: int, text_id: int):
+        with self._pool.connection() as conn:
+            conn.execute('''
+                INSERT INTO text_paths (path, size, mtime_ns, text_id)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (path) DO UPDATE
+                   SET size = excluded.size, mtime_ns = excluded.mtime_ns,
+                       text_id = excluded.text_id
+            ''', (path, size, mtime_ns, text_id))
+
+    def add_text(self, content_hash, title, path, encoding, size, paragraphs, lazy=False) -> int:
+        """
+        写入一份新文本，paragraphs 为 [(start, end, content), ...]；lazy 为 True 时不存段落。
+        同一内容被并发加载时只有第一个写入生效，其余直接返回已有 id。
+        """
+        with self._pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM texts WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+            if row:
+                return row[0]
+            cursor = conn.execute('''
+                INSERT INTO texts (content_hash, title, path, encoding, size, paragraph_count, lazy)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (content_hash, title, path, encoding, size,
+                  None if lazy else len(paragraphs), int(lazy)))
+            text_id = cursor.lastrowid
+            conn.executemany('''
+                INSERT INTO text_paragraphs (text_id, idx, start_offset, end_offset, content)
+                VALUES (?, ?, ?, ?, ?)
+            ''', ((text_id, i, start, end, content)
+                  for i, (start, end, content) in enumerate(paragraphs)))
+            return text_id
+
+    def get_text(self, text_id: int) -> dict | None:
+        conn = self._pool.connection()
+        row = conn.execute('''
+            SELECT id, content_hash, title, path, encoding, size, paragraph_count, lazy
+              FROM texts WHERE id = ?
+        ''', (text_id,)).fetchone()
+        if row:
+            return {
+                "id": row[0],
+                "content_hash": row[1],
+                "title": row[2],
+                "path": row[3],
+                "encoding": row[4],
+                "size": row[5],
+                "paragraph_count": row[6],
+                "lazy": bool(row[7]),
+            }
+        return None
+
+    def set_paragraph_count(self, text_id: int, count: int):
+        """惰性文本扫描完成后回填段落数"""
+        with self._pool.connection() as conn:
+            conn.execute(
+                "UPDATE texts SET paragraph_count = ? WHERE id = ?", (count, text_id)
+            )
+
+    def list_texts(self) -> list:
+        conn = self._pool.connection()
+        return conn.execute("SELECT id, title FROM texts ORDER BY id").fetchall()
+
+    def get_paragraphs(self, text_id: int, start: int, limit: int) -> list:
+        """按主键范围取 [start, start + limit) 段，返回 [(idx, start, end, content), ...]"""
+        conn = self._pool.connection()
+        return conn.execute('''
+            SELECT idx, start_offset, end_offset, content FROM text_paragraphs
+             WHERE text_id = ? AND idx >= ? AND idx < ?
+             ORDER BY idx
+        ''', (text_id, start, start + limit)).fetchall()
@@ -1,21 +1,232 @@
-import sqlite3
 from .db_auth_services import AuthDB  # 引入认证模块
+from .db_pool_services import SQLitePool
+from .tokenize_services import word_key
+
+# SQLite 默认每条语句最多 999 个参数，留一点余量
+SQLITE_MAX_VARS = 900
+
+
+def word_norm(word: str) -> str:
+    """word_norm 列的取值：与分词用同一个归一化（tokenize_services.word_key），写入前在 Python 里算好"""
+    return word_key(word)
+
+
+def _merge_duplicates(conn):
+    """
+    合并 word_norm 相同的重复行：保留最早的一条（原始拼写和 added_time），
+    熟悉度取最近一次的，释义取最近一次非空的，其余删除。
+    """
+    conn.execute('''
+        UPDATE user_words AS keep
+           SET meaning = (
+                   SELECT d.meaning FROM user_words AS d
+                    WHERE d.user_id = keep.user_id AND d.lang = keep.lang
+                      AND d.word_norm = keep.word_norm
+                      AND d.meaning IS NOT NULL AND d.meaning != ''
+                    ORDER BY d.id DESC LIMIT 1
+               ),
+               level = (
+                   SELECT d.level FROM user_words AS d
+                    WHERE d.user_id = keep.user_id AND d.lang = keep.lang
+                      AND d.word_norm = keep.word_norm
+                    ORDER BY d.id DESC LIMIT 1
+               )
+         WHERE id IN (
+                   SELECT min(id) FROM user_words
+                    GROUP BY user_id, lang, word_norm
+                   HAVING count(*) > 1
+               )
+    ''')
+    conn.execute('''
+        DELETE FROM user_words
+         WHERE word_norm IS NOT NULL
+           AND id NOT IN (
+                   SELECT min(id) FROM user_words GROUP BY user_id, lang, word_norm
+               )
+    ''')
+
+
+def _migrate_word_norm(conn):
+    """
+    v1：增加归一化列 word_norm = lower(trim(word))，合并历史重复行，
+    并建立 (user_id, lang, word_norm) 唯一索引，供 upsert 使用。
+    （之后 v4 改为在 Python 里用 word_key 计算，见 _migrate_word_key）
+    """
+    conn.execute("ALTER TABLE user_words ADD COLUMN word_norm TEXT")
+    conn.execute("UPDATE user_words SET word_norm = lower(trim(word))")
+    _merge_duplicates(conn)
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_user_words_norm
+            ON user_words (user_id, lang, word_norm)
+    ''')
+
+
+def _migrate_sync_rev(conn):
+    """
+    v2：增量同步。全库单调递增的修订号保存在 sync_state，
+    user_words 的增、改由触发器打上新的 rev / updated_at，删除写入墓碑表 user_words_deleted。
+    已有数据以 id 作为初始 rev。
+    """
+    conn.execute("ALTER TABLE user_words ADD COLUMN rev INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE user_words ADD COLUMN updated_at TIMESTAMP")
+    conn.execute("UPDATE user_words SET rev = id, updated_at = added_time")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            id  INTEGER PRIMARY KEY CHECK (id = 1),
+            rev INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO sync_state (id, rev)
+        SELECT 1, coalesce(max(id), 0) FROM user_words
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_words_deleted (
+            user_id    INTEGER NOT NULL,
+            lang       TEXT NOT NULL,
+            word_norm  TEXT NOT NULL,
+            word       TEXT,
+            rev        INTEGER NOT NULL,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, lang, word_norm)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_words_rev
+            ON user_words (user_id, lang, rev)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_words_deleted_rev
+            ON user_words_deleted (user_id, lang, rev)
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS user_words_sync_insert
+        AFTER INSERT ON user_words
+        BEGIN
+            UPDATE sync_state SET rev = rev + 1 WHERE id = 1;
+            UPDATE user_words
+               SET rev = (SELECT rev FROM sync_state WHERE id = 1),
+                   updated_at = CURRENT_TIMESTAMP
+             WHERE id = NEW.id;
+            DELETE FROM user_words_deleted
+             WHERE user_id = NEW.user_id AND lang = NEW.lang AND word_norm = NEW.word_norm;
+        END
+    ''')
+    # 只监听业务列；触发器自己改 rev / updated_at 不会再次触发
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS user_words_sync_update
+        AFTER UPDATE OF word, meaning, level, lang ON user_words
+        BEGIN
+            UPDATE sync_state SET rev = rev + 1 WHERE id = 1;
+            UPDATE user_words
+               SET rev = (SELECT rev FROM sync_state WHERE id = 1),
+                   updated_at = CURRENT_TIMESTAMP
+             WHERE id = NEW.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS user_words_sync_delete
+        AFTER DELETE ON user_words
+        BEGIN
+            UPDATE sync_state SET rev = rev + 1 WHERE id = 1;
+            INSERT OR REPLACE INTO user_words_deleted (user_id, lang, word_norm, word, rev)
+            VALUES (OLD.user_id, OLD.lang, OLD.word_norm, OLD.word,
+                    (SELECT rev FROM sync_state WHERE id = 1));
+        END
+    ''')
+
+
+def _migrate_user_index(conn):
+    """
+    v3：(user_id, lang) 索引。SQLite 索引末尾自带 rowid(id)，
+    所以 WHERE user_id = ? AND lang = ? AND id > ? ORDER BY id 可以直接按索引顺序分页。
+    """
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_words_user
+            ON user_words (user_id, lang)
+    ''')
+
+
+def _migrate_word_key(conn):
+    """
+    v4：word_norm 改用与分词相同的 word_key 重新计算（SQL 的 lower 只转 ASCII，也不统一弯撇号），
+    原先不同、现在相同的行（Über / über、don’t / don't）按 v1 的规则合并。
+    合并删掉的行会经触发器写下墓碑，墓碑键仍在生词本里的要去掉，否则增量同步会让客户端删掉它；
+    已有墓碑的键同样重新计算。
+    """
+    conn.create_function("word_key", 1, word_key, deterministic=True)
+    conn.execute("DROP INDEX IF EXISTS idx_user_words_norm")
+    conn.execute("UPDATE user_words SET word_norm = word_key(word) WHERE word IS NOT NULL")
+    _merge_duplicates(conn)
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_user_words_norm
+            ON user_words (user_id, lang, word_norm)
+    ''')
+    conn.execute("UPDATE OR REPLACE user_words_deleted SET word_norm = word_key(word_norm)")
+    conn.execute('''
+        DELETE FROM user_words_deleted
+         WHERE EXISTS (
+                   SELECT 1 FROM user_words AS w
+                    WHERE w.user_id = user_words_deleted.user_id
+                      AND w.lang = user_words_deleted.lang
+                      AND w.word_norm = user_words_deleted.word_norm
+               )
+    ''')
+
+
+def _migrate_sync_update_guard(conn):
+    """
+    v5：v2 的更新触发器只看列名，值没变（比如重复提交同一个 level）也会推进 rev，
+    客户端下次增量同步就会白白拉回这些行。重建触发器，只在业务列真的变化时触发。
+    """
+    conn.execute("DROP TRIGGER IF EXISTS user_words_sync_update")
+    conn.execute('''
+        CREATE TRIGGER user_words_sync_update
+        AFTER UPDATE OF word, meaning, level, lang ON user_words
+        WHEN OLD.word IS NOT NEW.word
+          OR OLD.meaning IS NOT NEW.meaning
+          OR OLD.level IS NOT NEW.level
+          OR OLD.lang IS NOT NEW.lang
+        BEGIN
+            UPDATE sync_state SET rev = rev + 1 WHERE id = 1;
+            UPDATE user_words
+               SET rev = (SELECT rev FROM sync_state WHERE id = 1),
+                   updated_at = CURRENT_TIMESTAMP
+             WHERE id = NEW.id;
+        END
+    ''')
+
+
+# 按顺序执行；PRAGMA user_version 记录已执行到第几个
+MIGRATIONS = [
+    _migrate_word_norm,
+    _migrate_sync_rev,
+    _migrate_user_index,
+    _migrate_word_key,
+    _migrate_sync_update_guard,
+]
+
+# 导出时的列顺序（CSV 表头即此顺序）
+EXPORT_COLUMNS = ("id", "user_id", "lang", "word", "meaning", "level",
+                  "added_time", "updated_at", "rev")
+
 
 class UserWordDB:
     """负责用户单词数据库的管理，和用户表共用同一个 SQLite 文件"""
 
     def __init__(self, db_path):
         self.db_path = db_path
+        # 每线程一条长连接（WAL + busy_timeout），并与 AuthDB 共用
+        self._pool = SQLitePool.read_write(db_path)
         # ① 先用 AuthDB 确保 users 表存在
-        self.auth_db = AuthDB(db_path)
+        self.auth_db = AuthDB(db_path, pool=self._pool)
         # ② 再创建 user_words 表
         self.init_database()
 
     def init_database(self):
-        """初始化 user_words 表，并开启外键约束"""
+        """初始化 user_words 表"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("PRAGMA foreign_keys = ON")
+            with self._pool.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS user_words (
@@ -29,20 +240,38 @@ class UserWordDB:
                         FOREIGN KEY(user_id) REFERENCES users(id)
                     )
                 ''')
-                conn.commit()
+            self._migrate()
         except Exception as e:
             print(f"数据库初始化失败: {e}")
 
+    def _migrate(self):
+        """
+        依次执行未完成的迁移，每个迁移一个事务。
+        BEGIN IMMEDIATE 先拿写锁再读 user_version，多个 worker 同时启动时只会有一个真正执行。
+        """
+        conn = self._pool.connection()
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version >= len(MIGRATIONS):
+                    conn.commit()
+                    return
+                MIGRATIONS[version](conn)
+                conn.execute(f"PRAGMA user_version = {version + 1}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
     def get_all_words(self, user_id, lang="en"):
         """获取某用户、某语言的全部单词记录"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT word, meaning, level, added_time 
-                  FROM user_words 
-                 WHERE user_id = ? AND lang = ?
-            ''', (user_id, lang))
-            rows = cursor.fetchall()
+        conn = self._pool.connection()
+        rows = conn.execute('''
+            SELECT word, meaning, level, added_time 
+              FROM user_words 
+             WHERE user_id = ? AND lang = ?
+        ''', (user_id, lang)).fetchall()
 
         return [
             {
@@ -54,16 +283,117 @@ class UserWordDB:
             for row in rows
         ]
 
+    def get_words_page(self, user_id, lang="en", after_id=0, limit=500):
+        """
+        按 id 做 keyset 分页：返回 id > after_id 的最多 limit 条，
+        next_cursor 为本页最后一条的 id，没有更多数据时为 None。
+        """
+        conn = self._pool.connection()
+        rows = conn.execute('''
+            SELECT id, word, meaning, level, added_time
+              FROM user_words
+             WHERE user_id = ? AND lang = ? AND id > ?
+             ORDER BY id
+             LIMIT ?
+        ''', (user_id, lang, after_id, limit + 1)).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            'items': [
+                {
+                    'user_word':   row[1],
+                    'meaning':     row[2],
+                    'familiarity': row[3],
+                    'added_time':  row[4],
+                }
+                for row in rows
+            ],
+            'next_cursor': rows[-1][0] if has_more else None,
+        }
+
+    def iter_words(self, user_id=None, lang=None, batch_size=1000):
+        """
+        逐批读出单词记录（元组，列顺序见 EXPORT_COLUMNS），内存占用与总量无关。
+        user_id / lang 为 None 表示不过滤（导出全部用户）。
+        每批都按 id 重新查询、重新取当前线程的连接，不跨 yield 持有游标：
+        StreamingResponse 每次 next() 可能落在线程池的不同线程上。
+        """
+        where, params = ["id > ?"], []
+        if user_id is not None:
+            where.append("user_id = ?")
+            params.append(user_id)
+        if lang is not None:
+            where.append("lang = ?")
+            params.append(lang)
+        sql = f'''
+            SELECT {", ".join(EXPORT_COLUMNS)}
+              FROM user_words
+             WHERE {" AND ".join(where)}
+             ORDER BY id
+             LIMIT ?
+        '''
+
+        last_id = 0
+        while True:
+            conn = self._pool.connection()
+            rows = conn.execute(sql, (last_id, *params, batch_size)).fetchall()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+
+    def get_changes(self, user_id, since=0, lang="en"):
+        """
+        增量同步：返回 rev > since 的新增/修改记录和删除记录，以及当前修订号。
+        客户端保存返回的 rev，下次作为 since 传入；since=0 即全量。
+        """
+        conn = self._pool.connection()
+        # 显式读事务，保证 rev 与查询结果来自同一个 WAL 快照
+        conn.execute("BEGIN")
+        try:
+            rev = conn.execute("SELECT rev FROM sync_state WHERE id = 1").fetchone()[0]
+            rows = conn.execute('''
+                SELECT word, meaning, level, added_time, updated_at, rev
+                  FROM user_words
+                 WHERE user_id = ? AND lang = ? AND rev > ?
+                 ORDER BY rev
+            ''', (user_id, lang, since)).fetchall()
+            deleted = conn.execute('''
+                SELECT word, rev
+                  FROM user_words_deleted
+                 WHERE user_id = ? AND lang = ? AND rev > ?
+                 ORDER BY rev
+            ''', (user_id, lang, since)).fetchall()
+        finally:
+            conn.rollback()
+
+        return {
+            'rev': rev,
+            'changes': [
+                {
+                    'user_word':   row[0],
+                    'meaning':     row[1],
+                    'familiarity': row[2],
+                    'added_time':  row[3],
+                    'updated_at':  row[4],
+                    'rev':         row[5],
+                }
+                for row in rows
+            ],
+            'deleted': [{'user_word': row[0], 'rev': row[1]} for row in deleted],
+        }
+
     def get_single_word(self, user_id: int, word: str, lang="en"):
         """获取单个单词记录（含自定义释义和熟练度）"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT word, meaning, level
-                  FROM user_words
-                 WHERE user_id = ? AND word = ? AND lang = ?
-            """, (user_id, word, lang))
-            row = cursor.fetchone()
+        conn = self._pool.connection()
+        row = conn.execute("""
+            SELECT word, meaning, level
+              FROM user_words
+             WHERE user_id = ? AND lang = ? AND word_norm = ?
+        """, (user_id, lang, word_norm(word))).fetchone()
 
         if row:
             return {
@@ -73,53 +403,112 @@ class UserWordDB:
             }
         return None
 
+    def get_levels(self, user_id, words, lang="en") -> dict:
+        """
+        批量查熟悉度：words 为 word_key 得到的查词键（分词结果即是），返回 {word_norm: level}，
+        生词本里没有的不在结果中。走 (user_id, lang, word_norm) 唯一索引，每 SQLITE_MAX_VARS 个词一条查询。
+        """
+        words = list(dict.fromkeys(words))
+        levels = {}
+        conn = self._pool.connection()
+        for start in range(0, len(words), SQLITE_MAX_VARS):
+            chunk = words[start:start + SQLITE_MAX_VARS]
+            levels.update(conn.execute(f'''
+                SELECT word_norm, level FROM user_words
+                 WHERE user_id = ? AND lang = ?
+                   AND word_norm IN ({",".join("?" * len(chunk))})
+            ''', (user_id, lang, *chunk)))
+        return levels
+
     def add_single_word(self, user_id, word, level=0, lang="en"):
-        """插入一条新单词记录（首次查词时用）"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO user_words (user_id, word, level, lang)
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, word, level, lang))
-            conn.commit()
+        """插入一条新单词记录（首次查词时用）；已存在则保持原记录不变"""
+        with self._pool.connection() as conn:
+            conn.execute('''
+                INSERT INTO user_words (user_id, word, word_norm, level, lang)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, lang, word_norm) DO NOTHING
+            ''', (user_id, word, word_norm(word), level, lang))
 
     def update_user_meaning(self, user_id, word, meaning, lang="en"):
-        """更新用户自定义释义"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE user_words
-                   SET meaning = ?
-                 WHERE user_id = ? AND word = ? AND lang = ?
-            ''', (meaning, user_id, word, lang))
-            conn.commit()
+        """更新用户自定义释义，单词不存在则新建（熟悉度取默认值）"""
+        with self._pool.connection() as conn:
+            conn.execute('''
+                INSERT INTO user_words (user_id, word, word_norm, meaning, lang)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, lang, word_norm) DO UPDATE
+                   SET meaning = excluded.meaning
+            ''', (user_id, word, word_norm(word), meaning, lang))
 
     def update_word_level(self, user_id, word, familiarity, lang="en"):
         """更新用户单词的熟悉度，如果单词不存在则先添加"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # 先检查单词是否已存在
-            cursor.execute('''
-                SELECT COUNT(*) FROM user_words
-                WHERE user_id = ? AND lower(word) = lower(?) AND lang = ?
-            ''', (user_id, word, lang))
-            
-            # 如果不存在，先添加
-            if cursor.fetchone()[0] == 0:
-                cursor.execute('''
-                    INSERT INTO user_words (user_id, word, level, lang)
-                    VALUES (?, ?, ?, ?)
-                ''', (user_id, word, familiarity, lang))
+        with self._pool.connection() as conn:
+            conn.execute('''
+                INSERT INTO user_words (user_id, word, word_norm, level, lang)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, lang, word_norm) DO UPDATE
+                   SET level = excluded.level
+            ''', (user_id, word, word_norm(word), familiarity, lang))
+
+    def delete_word(self, user_id, word, lang="en") -> bool:
+        """删除一个单词（大小写无关），返回是否确实删除了记录"""
+        with self._pool.connection() as conn:
+            cursor = conn.execute('''
+                DELETE FROM user_words
+                 WHERE user_id = ? AND lang = ? AND word_norm = ?
+            ''', (user_id, lang, word_norm(word)))
+            return cursor.rowcount > 0
+
+    def update_word_levels(self, user_id, items, lang="en"):
+        """
+        批量更新熟悉度：items 为 [(word, level), ...]，在同一个事务里 executemany upsert。
+        返回与 items 一一对应的 [{"word", "status"}]，status 为 inserted / updated / invalid。
+        同一批里重复出现的单词以最后一次为准，后出现的记为 updated。
+        """
+        norms, rows = [], []
+        for word, level in items:
+            norm = word_norm(word) if isinstance(word, str) else ""
+            if not norm or not isinstance(level, int) or not 0 <= level <= 5:
+                norms.append(None)
+                continue
+            norms.append(norm)
+            rows.append((user_id, word, norm, level, lang))
+
+        existing = self._upsert_levels(rows) if rows else set()
+
+        results = []
+        for (word, _), norm in zip(items, norms):
+            if norm is None:
+                status = "invalid"
+            elif norm in existing:
+                status = "updated"
             else:
-                # 存在则更新
-                cursor.execute('''
-                    UPDATE user_words
-                    SET level = ?
-                    WHERE user_id = ? AND lower(word) = lower(?) AND lang = ?
-                ''', (familiarity, user_id, word, lang))
-                
-            conn.commit()
+                status = "inserted"
+                existing.add(norm)
+            results.append({"word": word, "status": status})
+        return results
+
+    def _upsert_levels(self, rows):
+        """一个事务内：先查出已存在的 word_norm，再 executemany upsert；返回写入前已存在的集合"""
+        existing = set()
+        with self._pool.connection() as conn:
+            # 先拿写锁，保证查到的“已存在”集合在写入前不会变
+            conn.execute("BEGIN IMMEDIATE")
+            user_id, lang = rows[0][0], rows[0][4]
+            norms = list({row[2] for row in rows})
+            for start in range(0, len(norms), SQLITE_MAX_VARS):
+                chunk = norms[start:start + SQLITE_MAX_VARS]
+                existing.update(r[0] for r in conn.execute(f'''
+                    SELECT word_norm FROM user_words
+                     WHERE user_id = ? AND lang = ?
+                       AND word_norm IN ({",".join("?" * len(chunk))})
+                ''', (user_id, lang, *chunk)))
+            conn.executemany('''
+                INSERT INTO user_words (user_id, word, word_norm, level, lang)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, lang, word_norm) DO UPDATE
+                   SET level = excluded.level
+            ''', rows)
+        return existing
 
     def get_username(self, user_id: int) -> str | None:
         """仅返回用户名，不暴露其他字段"""
@@ -0,0 +1,276 @@
+"""
+ECDICT 派生索引的构建命令。词典文件在服务运行期间是只读打开的，
+这些索引都需要离线构建一次（更换 en.db 后重新执行）：
+
+    python -m backend.services.dict_build_services nocase-index [--db data/en.db]
+    python -m backend.services.dict_build_services lemma-index  [--db data/en.db]
+    python -m backend.services.dict_build_services snapshot     [--db data/en.db]
+    python -m backend.services.dict_build_services suggest-index [--db data/en.db] [--fuzzy-scope common|all]
+"""
+import argparse
+import gzip
+import os
+import re
+import sqlite3
+import sys
+import time
+from array import array
+
+from .translation_services import (
+    ENTRY_COLUMNS,
+    NOCASE_INDEX_NAME,
+    lemma_index_path,
+    nocase_index_available,
+    nocase_key,
+)
+from .dict_snapshot_services import HEADER, MAGIC, pack_record, slot_of, snapshot_path
+from . import dict_suggest_services as suggest
+
+DEFAULT_DB_PATH = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/en.db")
+)
+
+
+def build_nocase_index(db_path: str) -> bool:
+    """
+    在 stardict.word 上建立 COLLATE NOCASE 索引，让大小写无关查询一次命中。
+    已有可用索引（如 word 列本身就是 NOCASE）时不重复建立，返回 False。
+    """
+    with sqlite3.connect(db_path) as conn:
+        if nocase_index_available(conn):
+            return False
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {NOCASE_INDEX_NAME} "
+            "ON stardict (word COLLATE NOCASE)"
+        )
+        conn.commit()
+    return True
+
+
+# exchange 字段里表示屈折形式的类型：过去式、过去分词、现在分词、第三人称单数、比较级、最高级、复数
+INFLECTION_TYPES = frozenset("pdi3rts")
+
+
+def parse_exchange(exchange: str) -> dict:
+    """把 "p:ran/d:run/i:running/0:run" 拆成 {"p": "ran", ...}"""
+    parts = {}
+    for item in (exchange or "").split("/"):
+        kind, sep, value = item.partition(":")
+        if sep and value:
+            parts[kind.strip()] = value.strip()
+    return parts
+
+
+def build_lemma_index(db_path: str, out_path: str | None = None) -> int:
+    """
+    从 stardict.exchange 倒排出 屈折形式 → 原形 的映射，写成按词形排序的 gzip TSV。
+    一个词形对应多个原形时（如 found ← find / found），取词频更高的原形。
+    返回写入的条目数。
+    """
+    out_path = out_path or lemma_index_path(db_path)
+    with sqlite3.connect(db_path) as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(stardict)")}
+        # 词频高的先处理，setdefault 保证先到先得
+        order = "ORDER BY CASE WHEN frq > 0 THEN frq ELSE 1e12 END" if "frq" in columns else ""
+        rows = conn.execute(
+            "SELECT word, exchange FROM stardict "
+            f"WHERE exchange IS NOT NULL AND exchange != '' {order}"
+        )
+        lemmas = {}
+        for word, exchange in rows:
+            parts = parse_exchange(exchange)
+            # 原形词条：列出自己的各个屈折形式
+            for kind, form in parts.items():
+                if kind in INFLECTION_TYPES and form.lower() != word.lower():
+                    lemmas.setdefault(form.lower(), word)
+            # 屈折形式词条：0 给出原形
+            lemma = parts.get("0")
+            if lemma and lemma.lower() != word.lower():
+                lemmas.setdefault(word.lower(), lemma)
+
+    tmp_path = out_path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for form in sorted(lemmas):
+            if "\t" in form or "\n" in form:
+                continue
+            f.write(f"{form}\t{lemmas[form]}\n")
+    os.replace(tmp_path, out_path)
+    return len(lemmas)
+
+
+def build_snapshot(db_path: str, out_path: str | None = None) -> int:
+    """
+    导出 mmap 快照（格式见 dict_snapshot_services），返回记录数。
+    按 `word COLLATE NOCASE` 顺序流式写出——它与 nocase_key(word) 的 UTF-8 字节序一致，
+    内存里只保留偏移数组。
+    """
+    out_path = out_path or snapshot_path(db_path)
+    tmp_path = out_path + ".tmp"
+    offsets = array("Q")
+    first_of_key = []  # 每个不同键第一条记录的 (序号, crc 用的键)
+    prev_key = None
+
+    with sqlite3.connect(db_path) as conn, open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 0, 0, 0, 0))
+        rows = conn.execute(
+            f"SELECT {ENTRY_COLUMNS} FROM stardict ORDER BY word COLLATE NOCASE"
+        )
+        for row in rows:
+            key = nocase_key(row[1]).encode("utf-8")
+            if prev_key is not None and key < prev_key:
+                raise ValueError(f"排序与 NOCASE 键不一致: {row[1]!r}")
+            if key != prev_key:
+                first_of_key.append((len(offsets), key))
+            prev_key = key
+            offsets.append(f.tell())
+            f.write(pack_record(key, row))
+
+        # 负载因子 0.5 的开放寻址表
+        nslots = max(2 * len(first_of_key), 1)
+        slots = array("Q", bytes(8 * nslots))
+        for index, key in first_of_key:
+            slot = slot_of(key, nslots)
+            while slots[slot]:
+                slot = (slot + 1) % nslots
+            slots[slot] = index + 1
+
+        offsets_pos = f.tell()
+        slots_pos = offsets_pos + 8 * len(offsets)
+        if sys.byteorder != "little":
+            offsets.byteswap()
+            slots.byteswap()
+        offsets.tofile(f)
+        slots.tofile(f)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(offsets), offsets_pos, slots_pos, nslots))
+
+    os.replace(tmp_path, out_path)
+    return len(offsets)
+
+
+# 纠错只针对单个词（不含空格的短语），避免删除索引体积失控
+_FUZZY_WORD = re.compile(r"[a-z][a-z'\-]*")
+
+
+def build_suggest_index(db_path: str, out_path: str | None = None,
+                        fuzzy_scope: str = "common") -> tuple:
+    """
+    构建前缀补全 + 纠错索引（格式见 dict_suggest_services），返回 (词数, 删除变体条数)。
+    前缀部分覆盖全部词条；纠错部分默认只收录有词频/考试标签/柯林斯/牛津标记的常用单词，
+    fuzzy_scope="all" 时收录全部单词（索引会大很多）。
+    """
+    out_path = out_path or suggest.suggest_index_path(db_path)
+    tmp_path = out_path + ".tmp"
+
+    with sqlite3.connect(db_path) as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(stardict)")}
+        ranks = [f"CASE WHEN {c} > 0 THEN {c} END" for c in ("frq", "bnc") if c in columns]
+        rank_expr = f"COALESCE({', '.join(ranks)}, {suggest.UNRANKED})" if ranks else str(suggest.UNRANKED)
+        marks = [f"{c} > 0" for c in ("frq", "bnc", "collins", "oxford") if c in columns]
+        if "tag" in columns:
+            marks.append("COALESCE(tag, '') != ''")
+        common_expr = " OR ".join(marks) if marks and fuzzy_scope == "common" else "1"
+        rows = conn.execute(
+            f"SELECT word, {rank_expr}, {common_expr} FROM stardict "
+            "ORDER BY word COLLATE NOCASE, id"
+        )
+
+        offsets = array("Q")
+        fuzzy_words = []  # (词序号, key)
+        with open(tmp_path, "wb") as f:
+            f.write(suggest.HEADER.pack(suggest.MAGIC, 0, 0, 0, 0, 0, 0))
+            group = None  # [key, rank, word, common]
+            keys, key_ranks = [], []
+
+            def flush(g):
+                key, rank, word, common = g
+                index = len(offsets)
+                offsets.append(f.tell())
+                rank = min(rank, suggest.UNRANKED)
+                f.write(suggest.pack_word(key.encode("utf-8"), rank, word))
+                keys.append(key)
+                key_ranks.append(rank)
+                if common and _FUZZY_WORD.fullmatch(key):
+                    fuzzy_words.append((index, key))
+
+            for word, rank, common in rows:
+                key = nocase_key(word)
+                if group and group[0] == key:
+                    group[1] = min(group[1], rank)
+                    group[3] = group[3] or common
+                    continue
+                if group:
+                    flush(group)
+                group = [key, rank, word, common]
+            if group:
+                flush(group)
+
+            deletes = sorted(
+                (suggest.delete_hash(variant) << 32) | index
+                for index, key in fuzzy_words
+                for variant in suggest.delete_variants(key[:suggest.PREFIX_LEN])
+            )
+            buckets = suggest.prefix_buckets(keys, key_ranks)
+            top_keys = array("Q", (bucket_key for bucket_key, _ in buckets))
+            top_ids = array("I")
+            for _, top in buckets:
+                top_ids.extend(top)
+                top_ids.extend([suggest.UNRANKED] * (suggest.PREFIX_TOP - len(top)))
+
+            offsets_pos = f.tell()
+            deletes_pos = offsets_pos + 8 * len(offsets)
+            tops_pos = deletes_pos + 8 * len(deletes)
+            deletes = array("Q", deletes)
+            if sys.byteorder != "little":
+                offsets.byteswap()
+                deletes.byteswap()
+                top_keys.byteswap()
+                top_ids.byteswap()
+            offsets.tofile(f)
+            deletes.tofile(f)
+            top_keys.tofile(f)
+            top_ids.tofile(f)
+            f.seek(0)
+            f.write(suggest.HEADER.pack(
+                suggest.MAGIC, len(offsets), offsets_pos, len(deletes), deletes_pos,
+                len(top_keys), tops_pos
+            ))
+
+    os.replace(tmp_path, out_path)
+    return len(offsets), len(deletes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="构建 ECDICT 派生索引")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="ECDICT 数据库路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("nocase-index", help="大小写无关的单词索引")
+    sub.add_parser("lemma-index", help="屈折形式 → 原形索引（基于 exchange 字段）")
+    sub.add_parser("snapshot", help="供 DICT_ENGINE=snapshot 使用的内存映射快照")
+    p_suggest = sub.add_parser("suggest-index", help="/translation/suggest 使用的前缀 + 纠错索引")
+    p_suggest.add_argument("--fuzzy-scope", choices=["common", "all"], default="common",
+                           help="纠错收录范围：common 仅常用词（默认），all 全部单词")
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.db):
+        parser.error(f"找不到词典文件: {args.db}")
+
+    start = time.time()
+    if args.command == "nocase-index":
+        created = build_nocase_index(args.db)
+        print("NOCASE 索引已建立" if created else "已存在可用的 NOCASE 索引，跳过")
+    elif args.command == "lemma-index":
+        count = build_lemma_index(args.db)
+        print(f"原形索引已写入 {lemma_index_path(args.db)}，共 {count} 个词形")
+    elif args.command == "snapshot":
+        count = build_snapshot(args.db)
+        print(f"快照已写入 {snapshot_path(args.db)}，共 {count} 条词条")
+    elif args.command == "suggest-index":
+        words, deletes = build_suggest_index(args.db, fuzzy_scope=args.fuzzy_scope)
+        print(f"补全索引已写入 {suggest.suggest_index_path(args.db)}，"
+              f"共 {words} 个词、{deletes} 条删除变体")
+    print(f"耗时 {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
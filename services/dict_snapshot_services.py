@@ -0,0 +1,117 @@
+"""
+ECDICT 的只读内存映射快照。
+
+把 TranslationService 用到的 stardict 列导出成一个按 NOCASE 键排序的二进制文件，
+查词时直接在 mmap 上做哈希探测（crc32 开放寻址），不经过 SQLite。
+多个 uvicorn worker 映射同一个文件，共享操作系统的页缓存，不再各自维护一份 SQLite 缓存。
+
+文件布局（小端）：
+    header   : magic(8) | count(uint64) | offsets_pos(uint64) | slots_pos(uint64) | nslots(uint64)
+    records  : key_len(uint16) key | id(uint32) | 5 × (len(uint32) bytes)
+               5 个字段依次为 word, phonetic, definition, translation, exchange
+    offsets  : count × uint64，每条记录的起始位置，按 key 字节序排列
+    slots    : nslots × uint64，哈希槽，存 (同键第一条记录的序号 + 1)，0 表示空槽
+"""
+import mmap
+import os
+import struct
+import zlib
+
+MAGIC = b"ECDSNAP2"
+HEADER = struct.Struct("<8sQQQQ")
+KEY_LEN = struct.Struct("<H")
+U32 = struct.Struct("<I")
+U64 = struct.Struct("<Q")
+FIELD_COUNT = 5
+
+
+def snapshot_path(db_path: str) -> str:
+    """快照文件与 en.db 放在一起（由 dict_build_services snapshot 生成）"""
+    return os.path.splitext(db_path)[0] + ".snapshot"
+
+
+def pack_record(key: bytes, row) -> bytes:
+    """把一行 (id, word, phonetic, definition, translation, exchange) 编码成一条记录"""
+    row_id, *fields = row
+    parts = [KEY_LEN.pack(len(key)), key, U32.pack(row_id)]
+    for value in fields:
+        data = (value or "").encode("utf-8")
+        parts.append(U32.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def slot_of(key: bytes, nslots: int) -> int:
+    """键的起始哈希槽；crc32 跨进程稳定，不受 PYTHONHASHSEED 影响"""
+    return zlib.crc32(key) % nslots
+
+
+class DictSnapshot:
+    """快照读取器；只做切片和 unpack_from，多线程并发读取安全"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        magic, self.count, self._offsets_pos, self._slots_pos, self._nslots = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"不是有效的词典快照: {path}")
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def _record_at(self, index: int) -> int:
+        return U64.unpack_from(self._mm, self._offsets_pos + 8 * index)[0]
+
+    def _key_at(self, pos: int) -> bytes:
+        (key_len,) = KEY_LEN.unpack_from(self._mm, pos)
+        return self._mm[pos + 2:pos + 2 + key_len]
+
+    def _find_first(self, key: bytes) -> int:
+        """键为 key 的第一条记录的序号，不存在返回 -1"""
+        if not self._nslots:
+            return -1
+        mm, slots_pos, nslots = self._mm, self._slots_pos, self._nslots
+        slot = slot_of(key, nslots)
+        while True:
+            (value,) = U64.unpack_from(mm, slots_pos + 8 * slot)
+            if value == 0:
+                return -1
+            if self._key_at(self._record_at(value - 1)) == key:
+                return value - 1
+            slot = (slot + 1) % nslots
+
+    def _read_row(self, pos: int) -> tuple:
+        """解出与 SQLite 查询结果同结构的行：(id, word, phonetic, definition, translation, exchange)"""
+        mm = self._mm
+        (key_len,) = KEY_LEN.unpack_from(mm, pos)
+        pos += 2 + key_len
+        (row_id,) = U32.unpack_from(mm, pos)
+        pos += 4
+        row = [row_id]
+        for _ in range(FIELD_COUNT):
+            (size,) = U32.unpack_from(mm, pos)
+            pos += 4
+            row.append(mm[pos:pos + size].decode("utf-8"))
+            pos += size
+        return tuple(row)
+
+    def candidates(self, key: str) -> list:
+        """NOCASE 键等于 key 的全部词条（即与查询词大小写无关相等的词条）"""
+        key = key.encode("utf-8")
+        rows = []
+        index = self._find_first(key)
+        while 0 <= index < self.count:
+            pos = self._record_at(index)
+            if self._key_at(pos) != key:
+                break
+            rows.append(self._read_row(pos))
+            index += 1
+        return rows
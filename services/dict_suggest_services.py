@@ -0,0 +1,252 @@
+"""
+词典前缀补全 + 拼写纠错索引（离线构建一次，运行时只读 mmap）。
+
+- 前缀：全部词条的 NOCASE 键按字节序排好，二分定位后顺序扫描。
+  匹配超过 PREFIX_SCAN_LIMIT 条的前缀（t、th、inter 等）在构建时就按词频取好前 PREFIX_TOP 个，
+  查询时直接读出，不在截断的字母序窗口里排序。
+- 纠错：SymSpell 式删除索引。对纠错范围内每个词取前 PREFIX_LEN 个字符，
+  生成编辑距离 ≤ MAX_DISTANCE 的全部删除变体，记录 (crc32(变体) << 32 | 词序号)
+  并排序；查询时对输入做同样的删除变体，逐个二分取出候选，再用真实编辑距离校验。
+
+文件布局（小端；读取时直接按本机字节序 cast，因此只支持小端平台）：
+    header  : magic(8) | count | offsets_pos | deletes_count | deletes_pos | tops_count | tops_pos (均为 uint64)
+    words   : key_len(uint16) key | rank(uint32) | word_len(uint16) word
+    offsets : count × uint64，按 key 排序的记录位置
+    deletes : deletes_count × uint64，已排序
+    tops    : tops_count × uint64 的桶键 (前缀首条词序号 << 16 | 前缀字节数)，已排序；
+              随后 tops_count × PREFIX_TOP 个 uint32 词序号，按词频排好，不足的用 UNRANKED 填充
+"""
+import heapq
+import mmap
+import os
+import struct
+import zlib
+from bisect import bisect_left
+from itertools import combinations, groupby
+
+MAGIC = b"ECDSUGG2"
+HEADER = struct.Struct("<8sQQQQQQ")
+KEY_LEN = struct.Struct("<H")
+RANK = struct.Struct("<I")
+
+PREFIX_LEN = 7
+MAX_DISTANCE = 2
+UNRANKED = 0xFFFFFFFF
+# 匹配不超过这么多条的前缀直接扫描后按词频排序；更多的查预先排好的桶
+PREFIX_SCAN_LIMIT = 256
+# 每个桶保存的词数，不小于 /translation/suggest 的 limit 上限
+PREFIX_TOP = 50
+
+
+def suggest_index_path(db_path: str) -> str:
+    """索引文件与 en.db 放在一起（由 dict_build_services suggest-index 生成）"""
+    return os.path.splitext(db_path)[0] + ".suggest"
+
+
+def delete_variants(text: str, max_distance: int = MAX_DISTANCE) -> set:
+    """text 删去 0..max_distance 个字符得到的全部变体"""
+    variants = {text}
+    for n in range(1, min(max_distance, len(text)) + 1):
+        for drop in combinations(range(len(text)), n):
+            variants.add("".join(ch for i, ch in enumerate(text) if i not in drop))
+    return variants
+
+
+def delete_hash(variant: str) -> int:
+    return zlib.crc32(variant.encode("utf-8"))
+
+
+def edit_distance(a: str, b: str, limit: int = MAX_DISTANCE) -> int:
+    """
+    限界的 Damerau-Levenshtein（OSA）距离，只计算 |i - j| ≤ limit 的对角带；
+    超过 limit 时提前返回 limit + 1。
+    """
+    if a == b:
+        return 0
+    la, lb = len(a), len(b)
+    if abs(la - lb) > limit:
+        return limit + 1
+    over = limit + 1
+    prev2 = None
+    prev = [j if j <= limit else over for j in range(lb + 1)]
+    for i in range(1, la + 1):
+        cur = [over] * (lb + 1)
+        if i <= limit:
+            cur[0] = i
+        lo, hi = max(1, i - limit), min(lb, i + limit)
+        row_min = cur[0] if lo == 1 else over
+        ca = a[i - 1]
+        for j in range(lo, hi + 1):
+            cb = b[j - 1]
+            value = prev[j - 1] if ca == cb else prev[j - 1] + 1
+            if prev[j] + 1 < value:
+                value = prev[j] + 1
+            if cur[j - 1] + 1 < value:
+                value = cur[j - 1] + 1
+            if (prev2 is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb
+                    and prev2[j - 2] + 1 < value):
+                value = prev2[j - 2] + 1
+            cur[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return over
+        prev2, prev = prev, cur
+    return prev[lb] if prev[lb] <= limit else over
+
+
+def distance_limit(key: str) -> int:
+    """短词只纠正 1 处错误，否则候选太多且多为噪声"""
+    return 1 if len(key) <= 4 else MAX_DISTANCE
+
+
+def prefix_sort_key(key: str, rank: int) -> tuple:
+    """前缀补全的排序：词频（未知的排后）、长度、字母序"""
+    return rank, len(key), key
+
+
+def prefix_buckets(keys: list, ranks: list) -> list:
+    """
+    keys 为按字节序排好的全部 key，返回 [(桶键, [词序号, ...]), ...]（按桶键排序）：
+    匹配超过 PREFIX_SCAN_LIMIT 条的每个前缀一个桶，保存按 prefix_sort_key 排好的前 PREFIX_TOP 个词。
+    逐层加长前缀，只在上一层超限的区间里继续分组，总工作量约为 词数 × 超限前缀的深度。
+    """
+    buckets = []
+    ranges = [(0, len(keys))]
+    length = 0
+    while ranges:
+        length += 1
+        next_ranges = []
+        for lo, hi in ranges:
+            # 比当前前缀还短的 key 只可能是前缀本身，排在区间开头
+            start = lo
+            while start < hi and len(keys[start]) < length:
+                start += 1
+            for head, group in groupby(range(start, hi), key=lambda i: keys[i][:length]):
+                members = list(group)
+                if len(members) <= PREFIX_SCAN_LIMIT:
+                    continue
+                top = heapq.nsmallest(PREFIX_TOP, members,
+                                      key=lambda i: prefix_sort_key(keys[i], ranks[i]))
+                buckets.append(((members[0] << 16) | len(head.encode("utf-8")), top))
+                next_ranges.append((members[0], members[-1] + 1))
+        ranges = next_ranges
+    buckets.sort()
+    return buckets
+
+
+def pack_word(key: bytes, rank: int, word: str) -> bytes:
+    data = word.encode("utf-8")
+    return b"".join((KEY_LEN.pack(len(key)), key, RANK.pack(rank),
+                     KEY_LEN.pack(len(data)), data))
+
+
+class SuggestIndex:
+    """只读的补全/纠错索引；查询只做切片和二分，多线程并发安全"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        magic = self._mm[:len(MAGIC)]
+        if magic != MAGIC:
+            self._mm.close()
+            self._file.close()
+            raise ValueError(f"不是有效的补全索引（旧版索引请重新运行 suggest-index）: {path}")
+        _, self.count, offsets_pos, deletes_count, deletes_pos, tops_count, tops_pos = \
+            HEADER.unpack_from(self._mm, 0)
+        view = memoryview(self._mm)
+        self._offsets = view[offsets_pos:offsets_pos + 8 * self.count].cast("Q")
+        self._deletes = view[deletes_pos:deletes_pos + 8 * deletes_count].cast("Q")
+        self._top_keys = view[tops_pos:tops_pos + 8 * tops_count].cast("Q")
+        ids_pos = tops_pos + 8 * tops_count
+        self._top_ids = view[ids_pos:ids_pos + 4 * PREFIX_TOP * tops_count].cast("I")
+
+    def close(self):
+        self._offsets.release()
+        self._deletes.release()
+        self._top_keys.release()
+        self._top_ids.release()
+        self._mm.close()
+        self._file.close()
+
+    def _key_at(self, index: int) -> bytes:
+        pos = self._offsets[index]
+        (key_len,) = KEY_LEN.unpack_from(self._mm, pos)
+        return self._mm[pos + 2:pos + 2 + key_len]
+
+    def _entry_at(self, index: int) -> tuple:
+        """返回 (key, rank, word)"""
+        mm = self._mm
+        pos = self._offsets[index]
+        (key_len,) = KEY_LEN.unpack_from(mm, pos)
+        key = mm[pos + 2:pos + 2 + key_len].decode("utf-8")
+        pos += 2 + key_len
+        (rank,) = RANK.unpack_from(mm, pos)
+        (word_len,) = KEY_LEN.unpack_from(mm, pos + 4)
+        word = mm[pos + 6:pos + 6 + word_len].decode("utf-8")
+        return key, rank, word
+
+    def _lower_bound(self, key: bytes) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def prefix(self, key: str, limit: int = 10) -> list:
+        """以 key 开头的词，按词频（未知的排后）、长度、字母序排列"""
+        if not key:
+            return []
+        raw = key.encode("utf-8")
+        entries = []
+        first = index = self._lower_bound(raw)
+        while index < self.count and self._key_at(index).startswith(raw):
+            if len(entries) == PREFIX_SCAN_LIMIT:
+                return self._top(first, raw, limit)
+            entries.append(self._entry_at(index))
+            index += 1
+        entries.sort(key=lambda e: prefix_sort_key(e[0], e[1]))
+        return [word for _, _, word in entries[:limit]]
+
+    def _top(self, first: int, raw: bytes, limit: int) -> list:
+        """匹配条数超限的前缀：读构建时排好的桶"""
+        bucket_key = (first << 16) | len(raw)
+        i = bisect_left(self._top_keys, bucket_key)
+        if i == len(self._top_keys) or self._top_keys[i] != bucket_key:
+            return []
+        ids = self._top_ids[i * PREFIX_TOP:i * PREFIX_TOP + min(limit, PREFIX_TOP)]
+        return [self._entry_at(index)[2] for index in ids if index != UNRANKED]
+
+    def fuzzy(self, key: str, limit: int = 10) -> list:
+        """编辑距离 1..distance_limit(key) 内的词，按距离、词频排列；不含 key 本身"""
+        if not key:
+            return []
+        max_distance = distance_limit(key)
+        deletes = self._deletes
+        candidates = set()
+        for variant in delete_variants(key[:PREFIX_LEN], max_distance):
+            h = delete_hash(variant) << 32
+            i = bisect_left(deletes, h)
+            while i < len(deletes) and deletes[i] >> 32 == h >> 32:
+                candidates.add(deletes[i] & 0xFFFFFFFF)
+                i += 1
+
+        matches = []
+        for index in candidates:
+            cand_key, rank, word = self._entry_at(index)
+            if cand_key == key:
+                continue
+            distance = edit_distance(key, cand_key, max_distance)
+            if distance <= max_distance:
+                matches.append((distance, rank, cand_key, word))
+        matches.sort()
+        return [{"word": word, "distance": distance}
+                for distance, _, _, word in matches[:limit]]
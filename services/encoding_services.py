@@ -0,0 +1,125 @@
+# backend/services/encoding_services.py
+"""
+文本 / 字幕文件的编码探测与解码。
+
+1. BOM：直接确定 UTF-8 / UTF-16 / UTF-32
+2. 严格按 UTF-8 解码（C 实现，整文件也很快）
+3. 检测器只看头、中、尾三个窗口；置信度不够，或按结果整文件解码失败时，才对整个文件检测
+每个候选编码只解码一次，成功的结果直接返回，不会“先验证、再解码”地解两遍。
+调用方（TextManager、SubtitleManager）只在各自按内容哈希的存储 / 缓存未命中时才解码，这里不再另设缓存。
+
+检测器优先用可选的 cchardet（C 实现，pip install cchardet），没有则用 chardet。
+"""
+import codecs
+from itertools import chain
+from typing import Iterable, Iterator, Tuple
+
+try:
+    import cchardet as detector
+except ImportError:
+    import chardet as detector  # pip install chardet
+
+# 采样窗口大小与个数（头、中、尾）
+WINDOW_SIZE = 64 * 1024
+# 采样结果达到此置信度才直接采用，否则整文件检测
+CONFIDENT = 0.90
+# 整文件检测仍低于此置信度时视为无法判断，交给调用方的 fallbacks
+LOW_CONFIDENCE = 0.70
+# chardet 在全英文文本里易把 UTF-8 误判成 Windows-1252/LATIN-1，所以默认兜底用 Windows-1252
+FALLBACK_ENCODING = "windows-1252"
+
+# 检测器返回的名字 → 实际解码用的编码（取超集，避免 GBK 扩展字符解码失败）
+ALIASES = {
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+}
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def bom_encoding(raw: bytes) -> str | None:
+    """有 BOM 时返回对应编码（UTF-32 LE 的 BOM 以 UTF-16 LE 的 BOM 开头，先判断）"""
+    for bom, encoding in _BOMS:
+        if raw.startswith(bom):
+            return encoding
+    return None
+
+
+def _detect(raw: bytes) -> Tuple[str, float]:
+    det = detector.detect(raw)
+    encoding = (det.get("encoding") or "").lower()
+    return ALIASES.get(encoding, encoding), det.get("confidence") or 0.0
+
+
+def _samples(raw: bytes) -> bytes:
+    if len(raw) <= 3 * WINDOW_SIZE:
+        return raw
+    middle = (len(raw) - WINDOW_SIZE) // 2
+    return b"".join((raw[:WINDOW_SIZE],
+                     raw[middle:middle + WINDOW_SIZE],
+                     raw[-WINDOW_SIZE:]))
+
+
+def _candidates(raw: bytes) -> Iterator[str]:
+    """
+    按可信程度依次给出候选编码，由调用方逐个严格解码；前一个解码成功就不会再往下探测。
+    置信度太低的检测结果不给出，交给调用方的 fallbacks。
+    """
+    encoding = bom_encoding(raw)
+    if encoding is not None:
+        yield encoding
+        return
+    yield "utf-8"
+    samples = _samples(raw)
+    encoding, confidence = _detect(samples)
+    if confidence >= CONFIDENT:
+        yield encoding
+        if samples is raw:
+            return
+    if samples is not raw:
+        encoding, confidence = _detect(raw)
+    if confidence >= LOW_CONFIDENCE and encoding not in {"ascii", ""}:
+        yield encoding
+
+
+def sniff_encoding(head: bytes) -> str:
+    """只有文件开头一段时的探测（惰性加载用）；末尾被截断的多字节字符不算 UTF-8 错误"""
+    encoding = bom_encoding(head)
+    if encoding is not None:
+        return encoding
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    encoding, confidence = _detect(head)
+    if confidence < LOW_CONFIDENCE or encoding in {"ascii", ""}:
+        encoding = FALLBACK_ENCODING
+    return encoding
+
+
+def decode_bytes(
+    raw: bytes,
+    fallbacks: Iterable[str] = (FALLBACK_ENCODING,),
+) -> Tuple[str, str]:
+    """
+    探测并解码，返回 (文本, 编码名)。
+    探测不出或按探测结果解码失败时，依次严格尝试 fallbacks；都失败则用最后一个宽容解码（errors="replace"）。
+    """
+    tried = set()
+    encoding = None
+    for encoding in chain(_candidates(raw), fallbacks):
+        if not encoding or encoding in tried:
+            continue
+        tried.add(encoding)
+        try:
+            return raw.decode(encoding), encoding
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return raw.decode(encoding, errors="replace"), encoding
@@ -0,0 +1,168 @@
+# backend/services/job_services.py
+"""
+后台导入任务：有界线程池跑任务本身，CPU 密集的清洗可以再分块交给进程池（默认关闭，见 JobManager）。
+任务函数通过 progress(**fields) 回报进度；调用方轮询 get()，或用 wait() 等待下一次变化。
+"""
+import multiprocessing
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# 已结束的任务最多保留这么多个，超出后丢弃最早结束的
+MAX_FINISHED = 200
+
+
+def no_progress(**fields):
+    """不需要回报进度时的占位回调"""
+
+
+def map_chunks(
+    fn: Callable[[list], list],
+    items: Sequence,
+    chunk_size: int,
+    executor=None,
+    on_chunk: Optional[Callable[[int], None]] = None,
+) -> List:
+    """
+    把 items 按 chunk_size 分块交给 fn（接收列表、返回等长列表），按原顺序拼接结果。
+    给了进程池且不止一块时并行执行；fn 必须是模块级函数才能被 pickle。
+    on_chunk(已完成条数) 在每块完成后调用。
+    """
+    chunks = [list(items[i:i + chunk_size]) for i in range(0, len(items), chunk_size)]
+    mapper = executor.map if executor is not None and len(chunks) > 1 else map
+    results = []
+    for part in mapper(fn, chunks):
+        results.extend(part)
+        if on_chunk is not None:
+            on_chunk(len(results))
+    return results
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str = "queued"          # queued / running / done / error
+    progress: Dict[str, Any] = field(default_factory=dict)
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    version: int = 0                # 每次状态或进度变化 +1，供 wait() 判断
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "error")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "version": self.version,
+        }
+
+
+class JobManager:
+    """
+    任务队列；max_workers 限制同时运行的任务数，其余排队。
+    cpu_workers >= 2 时才启用清洗进程池。clean_paragraphs 主要是 C 实现的 str 操作，
+    段落来回 pickle 的开销与清洗本身相当，没有实测收益前默认在进程内清洗。
+    """
+
+    def __init__(self, max_workers: int = 2, cpu_workers: int = 1):
+        self._threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._cpu_workers = cpu_workers
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._jobs: Dict[str, Job] = {}
+        self._cond = threading.Condition()
+
+    @property
+    def cpu_executor(self) -> Optional[ProcessPoolExecutor]:
+        """
+        清洗等 CPU 密集工作用的进程池（首次使用时创建）；未启用（cpu_workers < 2）时返回 None。
+        首次使用时进程里已有多个线程，fork 出的子进程可能继承别的线程持有的锁（连接池、日志等）而死锁，
+        所以用 forkserver（没有时用 spawn）启动子进程。
+        """
+        if self._cpu_workers < 2:
+            return None
+        with self._cond:
+            if self._processes is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                self._processes = ProcessPoolExecutor(max_workers=self._cpu_workers, mp_context=context)
+            return self._processes
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args, **kwargs) -> Dict[str, Any]:
+        """
+        排队执行 fn(*args, progress=回调, **kwargs)，立即返回任务快照。
+        fn 的返回值即任务结果，需可 JSON 序列化。
+        """
+        job = Job(id=uuid.uuid4().hex[:16], kind=kind)
+        with self._cond:
+            self._jobs[job.id] = job
+            self._prune()
+        self._threads.submit(self._run, job, fn, args, kwargs)
+        return job.snapshot()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return job.snapshot() if job else None
+
+    def wait(self, job_id: str, version: int, timeout: float = 15.0) -> Optional[Dict[str, Any]]:
+        """阻塞到任务 version 大于给定值（或已结束、超时），返回最新快照"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: (job_id not in self._jobs
+                         or self._jobs[job_id].version > version
+                         or self._jobs[job_id].finished),
+                timeout=timeout,
+            )
+            job = self._jobs.get(job_id)
+            return job.snapshot() if job else None
+
+    def shutdown(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+
+    # ---------- 内部 ---------- #
+    def _update(self, job: Job, **changes):
+        with self._cond:
+            for name, value in changes.items():
+                setattr(job, name, value)
+            job.version += 1
+            self._cond.notify_all()
+
+    def _run(self, job: Job, fn, args, kwargs):
+        def progress(**fields):
+            with self._cond:
+                job.progress.update(fields)
+                job.version += 1
+                self._cond.notify_all()
+
+        self._update(job, status="running")
+        try:
+            result = fn(*args, progress=progress, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job, status="error", error=str(e), finished_at=time.time())
+        else:
+            self._update(job, status="done", result=result, finished_at=time.time())
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.finished]
+        if len(finished) > MAX_FINISHED:
+            finished.sort(key=lambda j: j.finished_at)
+            for j in finished[:len(finished) - MAX_FINISHED]:
+                del self._jobs[j.id]
@@ -1,9 +1,48 @@
 import srt
-from lxml import html
+import json
+import os
 import re
-import unicodedata
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from lxml import html
 from dataclasses import dataclass
 
+from .clean_services import clean_paragraphs, clean_text
+from .encoding_services import decode_bytes
+from .job_services import map_chunks, no_progress
+from .text_services import content_hash
+from .tokenize_services import tokenize, word_key
+
+# 探测出的编码解码失败时依次尝试；latin1 能解码任意字节
+SUBTITLE_FALLBACKS = ('gb18030', 'big5', 'latin1')
+# 清洗时每块多少条字幕（进程池并行的粒度）
+CLEAN_CHUNK = 500
+# 解析结果缓存目录；格式或清洗规则变化时改 CACHE_VERSION，旧缓存自然失效
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "subtitle_cache")
+CACHE_VERSION = 1
+# 解析缓存上限（压缩后的总字节数、文件数），超出时删除最久未用的
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_MAX_FILES = 1000
+# SubtitleRegistry 默认内存预算（按字幕文本与对象开销估算）
+REGISTRY_BUDGET = 64 * 1024 * 1024
+# 估算每条 cue 除文本以外的对象开销（Subtitle 实例 + 两个 int + 索引数组里的条目）
+CUE_OVERHEAD = 200
+# 估算每个词元的开销（(start, end, key) 元组 + 倒排表里的条目）
+TOKEN_OVERHEAD = 120
+
+# 字幕里常见的简单行内标签，可以不经 lxml 直接去掉
+_INLINE_TAG_RE = re.compile(r"</?(?:i|b|u|s|font|span)(?:\s[^<>]*)?/?>", re.IGNORECASE)
+
+
+def clean_cue_contents(contents):
+    """批量清洗字幕原文（去 HTML 标签后统一清洗）；模块级函数，可交给进程池"""
+    return clean_paragraphs(SubtitleManager._strip_html(c) for c in contents)
+
 
 @dataclass
 class Subtitle:
@@ -13,51 +52,187 @@ class Subtitle:
     content: str
 
 
+class _IntervalNode:
+    """居中区间树的节点：保存跨过 center 的 cue，分别按开始时间升序、结束时间降序排好"""
+    __slots__ = ("center", "starts", "by_start", "neg_ends", "by_end", "left", "right")
+
+    def __init__(self, intervals):
+        # intervals: [(start, end, 文件内下标)]；center 取全部端点的中位数，左右子树各不超过一半
+        points = sorted(p for start, end, _ in intervals for p in (start, end))
+        self.center = center = points[len(points) // 2]
+        here, left, right = [], [], []
+        for item in intervals:
+            if item[1] < center:
+                left.append(item)
+            elif item[0] > center:
+                right.append(item)
+            else:
+                here.append(item)
+        here.sort(key=lambda item: item[0])
+        self.starts = [item[0] for item in here]
+        self.by_start = [item[2] for item in here]
+        here.sort(key=lambda item: -item[1])
+        self.neg_ends = [-item[1] for item in here]
+        self.by_end = [item[2] for item in here]
+        self.left = _IntervalNode(left) if left else None
+        self.right = _IntervalNode(right) if right else None
+
+
+class SubtitleIndex:
+    """
+    字幕时间区间索引，加载时构建一次，查询 O(log n + 命中条数)，字幕重叠（包括跨越整部片子的长 cue）也一样。
+
+    区间部分是居中区间树：每个节点只保存跨过自身 center 的 cue，
+    查询时每层用二分直接切出命中的那一段，再只往一侧子树走。
+    另有按开始时间排好的数组，用于找下一条 cue。
+    """
+
+    def __init__(self, subtitles):
+        self._subtitles = subtitles
+        # 排序后的文件内下标；开始时间相同时保持文件顺序
+        self._order = sorted(range(len(subtitles)), key=lambda i: subtitles[i].start_time)
+        self._starts = [subtitles[i].start_time for i in self._order]
+        # 结束早于开始的 cue 不会覆盖任何时刻，不进区间树
+        intervals = [(s.start_time, s.end_time, i) for i, s in enumerate(subtitles)
+                     if s.end_time >= s.start_time]
+        self._root = _IntervalNode(intervals) if intervals else None
+
+    def _between(self, start_ms, end_ms):
+        """与 [start_ms, end_ms] 相交的 cue 的文件内下标（无序）"""
+        hits = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            if end_ms < node.center:
+                # 节点里的 cue 都延续到 center 之后，只需开始时间 <= end_ms；右子树全在 center 之后
+                hits.extend(node.by_start[:bisect_right(node.starts, end_ms)])
+                following = (node.left,)
+            elif start_ms > node.center:
+                # 对称：只需结束时间 >= start_ms；左子树全在 center 之前
+                hits.extend(node.by_end[:bisect_right(node.neg_ends, -start_ms)])
+                following = (node.right,)
+            else:
+                # 查询区间跨过 center：节点里的全部命中，两侧子树都可能有
+                hits.extend(node.by_start)
+                following = (node.left, node.right)
+            stack.extend(child for child in following if child is not None)
+        return hits
+
+    def at(self, position_ms):
+        """覆盖 position_ms 的 cue；有多条重叠时取文件里最靠前的一条，与原先逐条查找一致"""
+        hits = self._between(position_ms, position_ms)
+        return self._subtitles[min(hits)] if hits else None
+
+    def range(self, start_ms, end_ms):
+        """与 [start_ms, end_ms] 有重叠的全部 cue，按开始时间排序"""
+        hits = sorted(self._between(start_ms, end_ms),
+                      key=lambda i: (self._subtitles[i].start_time, i))
+        return [self._subtitles[i] for i in hits]
+
+    def next_after(self, position_ms):
+        """开始时间晚于 position_ms 的第一条 cue"""
+        k = bisect_right(self._starts, position_ms)
+        return self._subtitles[self._order[k]] if k < len(self._order) else None
+
+    def next_change(self, position_ms):
+        """
+        position_ms 之后 at() 的结果最早可能变化的时刻，之后不会再变时返回 None。
+        当前 cue 在 end_time 之后失效（区间两端都包含），或有新 cue 开始。
+        """
+        times = []
+        active = self.at(position_ms)
+        if active is not None:
+            times.append(active.end_time + 1)
+        following = self.next_after(position_ms)
+        if following is not None:
+            times.append(following.start_time)
+        return min(times) if times else None
+
+
 class SubtitleManager:
     """字幕管理类，负责字幕文件加载、解析和查询"""
 
     def __init__(self):
         self.subtitles = []
+        self.content_hash = None
+        self._build_indexes()
 
-    def load_subtitle(self, file_path):
+    def load_subtitle(self, file_path, progress=no_progress, executor=None):
         """
         加载 SRT 格式字幕文件，自动尝试多种编码
 
         Args:
             file_path: 字幕文件路径
+            progress: 进度回调 progress(**fields)
+            executor: 进程池；给出时分块并行清洗
         """
-        encodings_to_try = ['utf-8', 'utf-8-sig', 'gbk', 'big5', 'latin1']
-        for enc in encodings_to_try:
-            try:
-                with open(file_path, 'r', encoding=enc) as f:
-                    content = f.read()
-                break
-            except UnicodeDecodeError:
-                continue
-        else:
-            # UnicodeDecodeError 要求五个参数：encoding, object, start, end, reason
-            raise UnicodeDecodeError(
-                                 "utf-8",  # encoding
-                                 b"",  # object
-                                 0,  # start
-                                 0,  # end
-                                 "无法识别字幕文件编码，请转换为 UTF-8 或 GBK 等通用格式"
-                 )
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        self.load_bytes(raw, content_hash(raw), progress=progress, executor=executor)
 
+    def load_bytes(self, raw, digest, progress=no_progress, executor=None):
+        """
+        从已读出的字节加载字幕；digest 为 content_hash(raw)，用作解析缓存和编码探测缓存的键
+
+        Args:
+            raw: 字幕文件的全部字节
+            digest: 内容哈希
+            progress: 进度回调 progress(**fields)
+            executor: 进程池；给出时分块并行清洗
+        """
+        # BOM / UTF-8 / 采样检测，失败再依次尝试常见的中文编码，latin1 兜底
+        self.content_hash = digest
+
+        # 同一份字幕解析过就直接读缓存
+        cached = self._read_cache(digest)
+        if cached is not None:
+            progress(stage="cached", bytes_read=len(raw))
+            self.subtitles = cached
+            self._build_indexes()
+            return
+
+        progress(stage="decoding", bytes_read=len(raw))
+        content, _ = decode_bytes(raw, fallbacks=SUBTITLE_FALLBACKS)
+        # 与文本模式 open() 的通用换行一致
+        content = content.replace('\r\n', '\n').replace('\r', '\n')
+
+        progress(stage="parsing")
         srt_subtitles = list(srt.parse(content))
+
+        # 清理字幕内容：逐条去除 HTML 标签，再批量去除非字母字符
+        progress(stage="cleaning", cues_total=len(srt_subtitles), cues_cleaned=0)
+        cleaned = map_chunks(
+            clean_cue_contents,
+            [sub.content for sub in srt_subtitles],
+            CLEAN_CHUNK,
+            executor,
+            lambda done: progress(cues_cleaned=done),
+        )
+
         self.subtitles = []
-        for sub in srt_subtitles:
+        for sub, clean_content in zip(srt_subtitles, cleaned):
             start_time = SubtitleManager._timedelta_to_ms(sub.start)
             end_time = SubtitleManager._timedelta_to_ms(sub.end)
 
-            # 清理字幕内容：去除 HTML 标签和非字母字符
-            clean_content = self.clean_subtitle_text(sub.content)
-
             self.subtitles.append(Subtitle(
                 start_time=start_time,
                 end_time=end_time,
                 content=clean_content
             ))
+        self._build_indexes()
+        self._write_cache(digest, self.subtitles)
+
+    def _build_indexes(self):
+        """
+        加载后一次性构建：时间区间索引、每条 cue 的分词结果、单词 → cue 下标的倒排表
+        （下标按文件顺序、不重复）
+        """
+        self._index = SubtitleIndex(self.subtitles)
+        self._tokens = [tokenize(s.content) for s in self.subtitles]
+        self._word_cues = {}
+        for i, tokens in enumerate(self._tokens):
+            for key in dict.fromkeys(key for _, _, key in tokens):
+                self._word_cues.setdefault(key, []).append(i)
 
     @staticmethod
     def _timedelta_to_ms(td):
@@ -71,25 +246,97 @@ class SubtitleManager:
         使用 lxml 解析 HTML 并提取文本内容
         """
         # 1. 去 HTML 标签
-        tree = html.fromstring(text)
-        clean_text = tree.text_content()
+        # 2. 折叠空白（含换行、回车）、去控制字符和 S* / C* 类别字符，见 clean_services
+        return clean_text(SubtitleManager._strip_html(text))
 
-        # 2. 把换行、回车都替换为单个空格
-        clean_text = clean_text.replace('\r\n', ' ').replace('\n', ' ').replace('\r', ' ')
+    @staticmethod
+    def _strip_html(text: str) -> str:
+        """
+        提取 HTML 片段的文本内容。
+        绝大多数 cue 没有标签，或只有 <i>、<font> 这类简单标签，用正则去掉即可；
+        去完仍有 < 或 &（实体、复杂标签）时才交给 lxml 解析。
+        """
+        if '<' not in text and '&' not in text:
+            return text
+        stripped = _INLINE_TAG_RE.sub('', text)
+        if '<' not in stripped and '&' not in stripped:
+            return stripped
+        return html.fromstring(text).text_content()
 
-        # 3. 把连续的空白折叠成一个空格，并去掉首尾空白
-        clean_text = re.sub(r'\s+', ' ', clean_text).strip()
+    @staticmethod
+    def _cache_path(digest):
+        return os.path.join(CACHE_DIR, f"v{CACHE_VERSION}-{digest}.json.z")
 
-        # 4. 去掉除可打印之外的控制字符（选做）
-        clean_text = re.sub(r'[\x00-\x08\x0B-\x1F\x7F]', '', clean_text)
+    @staticmethod
+    def _read_cache(digest):
+        """读取解析缓存，不存在或损坏时返回 None"""
+        path = SubtitleManager._cache_path(digest)
+        try:
+            with open(path, 'rb') as f:
+                rows = json.loads(zlib.decompress(f.read()))
+            subtitles = [Subtitle(start, end, content) for start, end, content in rows]
+        except (OSError, ValueError, TypeError, zlib.error):
+            return None
+        # 刷新修改时间，清理时按它判断最久未用
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return subtitles
 
-        # 5. 去掉所有 Unicode 分类以 S（Symbol）或 C（Control） 开头的字符
-        clean_text = ''.join(
-            ch for ch in clean_text
-            if not unicodedata.category(ch).startswith(('S', 'C'))
-        )
+    @staticmethod
+    def _write_cache(digest, subtitles):
+        """写入解析缓存（先写临时文件再改名，并发加载同一文件也不会读到半截）；失败不影响加载"""
+        rows = [[s.start_time, s.end_time, s.content] for s in subtitles]
+        data = zlib.compress(json.dumps(rows, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        path = SubtitleManager._cache_path(digest)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"字幕缓存写入失败: {e}")
+            return
+        SubtitleManager._trim_cache()
 
-        return clean_text
+    @staticmethod
+    def _trim_cache():
+        """
+        缓存超出 CACHE_MAX_BYTES / CACHE_MAX_FILES 时按修改时间从旧到新删除；
+        其他版本的缓存直接删除。并发删除同一文件、文件已被删掉都不算错误。
+        """
+        current = f"v{CACHE_VERSION}-"
+        entries = []
+        try:
+            with os.scandir(CACHE_DIR) as it:
+                for entry in it:
+                    if not entry.name.endswith('.json.z'):
+                        continue
+                    try:
+                        if not entry.name.startswith(current):
+                            os.remove(entry.path)
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        except OSError:
+            return
+
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= CACHE_MAX_BYTES and count <= CACHE_MAX_FILES:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            count -= 1
 
     def get_subtitle_at(self, position_ms):
         """
@@ -98,11 +345,174 @@ class SubtitleManager:
         Args:
             position_ms: 当前播放位置（毫秒）
         """
-        for subtitle in self.subtitles:
-            if subtitle.start_time <= position_ms <= subtitle.end_time:
-                return subtitle
-        return None
+        return self._index.at(position_ms)
+
+    def get_range(self, start_ms, end_ms):
+        """
+        获取与时间段 [start_ms, end_ms] 有重叠的全部字幕，按开始时间排序
+
+        Args:
+            start_ms: 起始时间（毫秒）
+            end_ms: 结束时间（毫秒）
+        """
+        return self._index.range(start_ms, end_ms)
+
+    def next_cue_after(self, position_ms):
+        """
+        获取 position_ms 之后开始的下一条字幕
+
+        Args:
+            position_ms: 当前播放位置（毫秒）
+        """
+        return self._index.next_after(position_ms)
+
+    def next_change_after(self, position_ms):
+        """
+        获取 position_ms 之后当前字幕最早可能变化的时间（毫秒），之后不再变化时返回 None
+
+        Args:
+            position_ms: 当前播放位置（毫秒）
+        """
+        return self._index.next_change(position_ms)
 
     def has_subtitles(self):
         """检查是否加载了字幕"""
         return len(self.subtitles) > 0
+
+    def vocabulary(self):
+        """字幕里出现过的全部查词键"""
+        return list(self._word_cues)
+
+    def find_word(self, word):
+        """
+        包含某个单词的全部字幕，按文件顺序返回 [(cue 下标, Subtitle, [(start, end), ...])]，
+        start/end 为该词在 content 中的字符下标
+        """
+        key = word_key(word)
+        return [
+            (i, self.subtitles[i], [(start, end) for start, end, k in self._tokens[i] if k == key])
+            for i in self._word_cues.get(key, ())
+        ]
+
+    def unknown_density(self, levels):
+        """
+        每条字幕的生词统计 [(cue 下标, 词数, 生词出现次数, 生词列表)]；levels 为 {查词键: 熟悉度}，
+        不在 levels 里或熟悉度为 0 的词算生词，生词列表去重并保持出现顺序
+        """
+        result = []
+        for i, tokens in enumerate(self._tokens):
+            unknown = [key for _, _, key in tokens if not levels.get(key)]
+            result.append((i, len(tokens), len(unknown), list(dict.fromkeys(unknown))))
+        return result
+
+    def memory_size(self):
+        """估算占用的内存（字节），供 SubtitleRegistry 控制预算"""
+        return (sum(sys.getsizeof(s.content) + CUE_OVERHEAD for s in self.subtitles)
+                + sum(len(tokens) for tokens in self._tokens) * TOKEN_OVERHEAD)
+
+
+class PlaybackClock:
+    """
+    服务端推算的播放位置：客户端只在播放、暂停、跳转、变速时同步一次，
+    其余时间按 rate 外推，不必高频上报。
+    """
+
+    def __init__(self, position_ms=0, rate=1.0, paused=True):
+        self.rate = rate
+        self.paused = paused
+        self._anchor_ms = position_ms
+        self._anchor_at = time.monotonic()
+
+    def position(self):
+        """当前推算的播放位置（毫秒）"""
+        if self.paused:
+            return self._anchor_ms
+        return int(self._anchor_ms + (time.monotonic() - self._anchor_at) * 1000 * self.rate)
+
+    def update(self, position_ms=None, rate=None, paused=None):
+        """同步位置 / 速率 / 暂停状态；未给出的保持不变，位置从当前推算值继续"""
+        anchor = self.position() if position_ms is None else position_ms
+        if rate is not None:
+            self.rate = rate
+        if paused is not None:
+            self.paused = paused
+        self._anchor_ms = anchor
+        self._anchor_at = time.monotonic()
+
+    def seconds_until(self, target_ms):
+        """按当前速率播放到 target_ms 还需要的秒数；暂停或速率不为正时返回 None"""
+        if self.paused or self.rate <= 0:
+            return None
+        return max(0.0, (target_ms - self.position()) / 1000 / self.rate)
+
+
+class SubtitleRegistry:
+    """
+    已加载字幕轨道的注册表，track_id 取字幕内容哈希的前 16 位：
+    不同会话打开同一份字幕得到同一个 track_id，共用同一份解析结果。
+    总内存超出 budget 时按 LRU 淘汰最久未用的轨道（最近使用的那条总会保留）。
+    """
+
+    def __init__(self, budget=REGISTRY_BUDGET):
+        self.budget = budget
+        self._tracks = OrderedDict()  # track_id -> (SubtitleManager, 估算字节数)
+        self._size = 0
+        self._last = None             # 最近加载的 track_id，请求不带 track_id 时使用
+        self._lock = threading.Lock()
+
+    def load(self, file_path, progress=no_progress, executor=None):
+        """
+        加载字幕并登记，返回 (track_id, SubtitleManager)。
+        先读字节算哈希：同内容已登记时直接返回已有的那份，不再解析、分词；未登记才解析。
+        """
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        digest = content_hash(raw)
+        track_id = digest[:16]
+        with self._lock:
+            item = self._tracks.get(track_id)
+            if item is not None:
+                self._tracks.move_to_end(track_id)
+                self._last = track_id
+                progress(stage="registered", bytes_read=len(raw))
+                return track_id, item[0]
+
+        manager = SubtitleManager()
+        manager.load_bytes(raw, digest, progress=progress, executor=executor)
+        with self._lock:
+            # 解析期间别的请求可能已登记了同一份，以先登记的为准
+            item = self._tracks.get(track_id)
+            if item is not None:
+                manager = item[0]
+                self._tracks.move_to_end(track_id)
+            else:
+                size = manager.memory_size()
+                self._tracks[track_id] = (manager, size)
+                self._size += size
+                self._evict()
+            self._last = track_id
+        return track_id, manager
+
+    def get(self, track_id=None):
+        """按 track_id 取轨道（刷新 LRU 位置）；track_id 为空时取最近加载的，不存在返回 None"""
+        with self._lock:
+            track_id = track_id or self._last
+            item = self._tracks.get(track_id)
+            if item is None:
+                return None
+            self._tracks.move_to_end(track_id)
+            return item[0]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tracks": len(self._tracks),
+                "size": self._size,
+                "budget": self.budget,
+                "last": self._last,
+            }
+
+    def _evict(self):
+        while self._size > self.budget and len(self._tracks) > 1:
+            _, (_, size) = self._tracks.popitem(last=False)
+            self._size -= size
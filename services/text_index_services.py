@@ -0,0 +1,155 @@
+# backend/services/text_index_services.py
+"""
+超大 TXT 的惰性段落索引：mmap 整个文件，只在字节层面找空行分段，
+需要哪几段才扫描到哪里，段落内容由调用方按需解码、清洗。
+
+分段规则与 TextManager 的整文件处理一致：把 \\r\\n、\\r 视为换行后，
+“换行 + 任意空白 + 换行” 即段落分隔。空白字符按目标编码逐个编码成字节序列，
+所以只支持 ASCII 兼容、换行与空白不会出现在多字节字符内部的编码（UTF-8、GBK、cp125x 等）。
+"""
+import codecs
+import hashlib
+import mmap
+import re
+import sys
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Tuple
+
+# 指纹采样：文件头、尾和均匀分布的若干窗口
+SAMPLE_SIZE = 64 * 1024
+SAMPLE_COUNT = 64
+
+_STATEFUL = ("utf_7", "utf_16", "utf_32", "iso2022", "hz")
+
+
+def lazy_supported(encoding: str) -> bool:
+    """编码是否能直接在字节上找换行和空白"""
+    try:
+        name = codecs.lookup(encoding).name.replace("-", "_")
+    except LookupError:
+        return False
+    if name.startswith(_STATEFUL):
+        return False
+    return "\n\r \t".encode(encoding) == b"\n\r \t"
+
+
+@lru_cache(maxsize=1)
+def _unicode_spaces() -> Tuple[str, ...]:
+    """str 正则里 \\s 匹配的全部字符（换行单独处理）"""
+    return tuple(
+        ch for ch in map(chr, range(sys.maxunicode + 1))
+        if ch.isspace() and ch not in "\r\n"
+    )
+
+
+@lru_cache(maxsize=16)
+def _patterns(encoding: str) -> Tuple["re.Pattern", "re.Pattern"]:
+    """(段落分隔, 纯空白) 两个字节正则"""
+    single, multi = [], []
+    for ch in _unicode_spaces():
+        try:
+            data = ch.encode(encoding)
+        except UnicodeEncodeError:
+            continue
+        (single if len(data) == 1 else multi).append(re.escape(data))
+    # 空白串里 \r \n 随意组合都行；只有开头那个换行不能是 \r\n 里的 \r 单独算一个，
+    # 否则单个 \r\n 就会被当成两次换行
+    space = b"(?:" + b"|".join([rb"[\r\n" + b"".join(single) + b"]"] + multi) + b")"
+    separator = re.compile(rb"(?:\r\n|\r(?!\n)|\n)" + space + rb"*[\r\n]")
+    blank = re.compile(space + b"*")
+    return separator, blank
+
+
+def file_fingerprint(mm, size: int, origin: bytes = b"") -> str:
+    """
+    大文件的采样指纹（origin + 大小 + 头尾及均匀分布的 SAMPLE_COUNT 个窗口）。
+    只读取几 MB，与文件大小无关。采样本身分辨不了同样大小、只在未采样处不同的两个文件，
+    所以调用方应传入 origin（路径 + 修改时间），只有同一个未改动的文件才会得到相同指纹。
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(len(origin).to_bytes(8, "little"))
+    h.update(origin)
+    h.update(size.to_bytes(8, "little"))
+    if size <= SAMPLE_SIZE * SAMPLE_COUNT:
+        h.update(mm[:size])
+    else:
+        step = (size - SAMPLE_SIZE) // (SAMPLE_COUNT - 1)
+        for i in range(SAMPLE_COUNT):
+            pos = i * step
+            h.update(mm[pos:pos + SAMPLE_SIZE])
+    return "s2:" + h.hexdigest()
+
+
+class LazyText:
+    """
+    按需扩展的段落字节索引。spans[i] 为第 i 个非空段落在文件中的 [start, end)。
+    扫描只向前推进，已扫描的部分不再重复；多线程调用时由内部锁串行化扫描。
+    """
+
+    def __init__(self, path: str | Path, encoding: str):
+        if not lazy_supported(encoding):
+            raise ValueError(f"编码 {encoding} 不支持惰性分段")
+        self.path = Path(path)
+        self.encoding = encoding
+        self._file = open(self.path, "rb")
+        try:
+            self.size = self.path.stat().st_size
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        except Exception:
+            self._file.close()
+            raise
+        self._separator, self._blank = _patterns(encoding)
+        self._spans: List[Tuple[int, int]] = []
+        self._pos = 0
+        self._done = False
+        self._lock = threading.Lock()
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+    @property
+    def complete(self) -> bool:
+        return self._done
+
+    def indexed(self) -> int:
+        return len(self._spans)
+
+    def fingerprint(self, origin: bytes = b"") -> str:
+        return file_fingerprint(self._mm, self.size, origin)
+
+    def head(self, size: int) -> bytes:
+        return self._mm[:size]
+
+    def _add(self, start: int, end: int):
+        if not self._blank.fullmatch(self._mm, start, end):
+            self._spans.append((start, end))
+
+    def _scan_until(self, count: int):
+        """至少索引到 count 段，或到文件末尾"""
+        if self._done or len(self._spans) >= count:
+            return
+        with self._lock:
+            if self._done or len(self._spans) >= count:
+                return
+            for m in self._separator.finditer(self._mm, self._pos):
+                self._add(self._pos, m.start())
+                self._pos = m.end()
+                if len(self._spans) >= count:
+                    return
+            self._add(self._pos, self.size)
+            self._pos = self.size
+            self._done = True
+
+    def count(self) -> int:
+        """段落总数（会扫描整个文件）"""
+        self._scan_until(sys.maxsize)
+        return len(self._spans)
+
+    def raw_paragraphs(self, start: int, limit: int) -> List[bytes]:
+        """第 [start, start + limit) 段的原始字节"""
+        self._scan_until(start + limit)
+        return [self._mm[a:b] for a, b in self._spans[start:start + limit]]
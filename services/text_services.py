@@ -4,9 +4,29 @@ from __future__ import annotations
 from dataclasses import dataclass
 from pathlib import Path
 from typing import List, Dict, Tuple
+import hashlib
 import re
-import unicodedata
-import chardet  # pip install chardet
+import threading
+
+from .cache_services import LRUCache
+from .clean_services import clean_paragraphs, clean_text
+from .db_texts_services import TextDB
+from .encoding_services import decode_bytes, sniff_encoding
+from .job_services import map_chunks, no_progress
+from .text_index_services import LazyText, lazy_supported
+from .tokenize_services import sentence_spans
+
+DEFAULT_DB_PATH = Path(__file__).resolve().parent.parent / "data" / "texts.db"
+# 不小于此大小的文件默认走惰性模式（mmap + 按需分段、清洗）
+LAZY_THRESHOLD = 64 * 1024 * 1024
+# 惰性模式只读文件头来判断编码
+SNIFF_SIZE = 1024 * 1024
+# 带进度读取时每次读多少字节
+READ_CHUNK = 4 * 1024 * 1024
+# 清洗时每块多少段（进程池并行的粒度）
+CLEAN_CHUNK = 2000
+# 段落分隔：空行（换行已统一为 \n）
+PARA_SPLIT_RE = re.compile(r"\n\s*\n+")
 
 
 # ------------------------- 数据结构 ------------------------- #
@@ -15,138 +35,280 @@ class TextFile:
     id: int
     title: str              # 默认用文件名（不含后缀）
     path: Path
-    paragraphs: List[str]   # 清洗后段落
+    paragraph_count: int | None  # 清洗后段落数；惰性文本未扫描完时为 None
     encoding: str           # 实际使用的编码名
+    content_hash: str       # 文件字节的 blake2b 摘要（惰性文本为路径 + 修改时间 + 采样指纹）
+    lazy: bool = False      # True：段落不入库，按需从源文件读取
+
+
+def content_hash(raw: bytes) -> str:
+    """文件内容摘要，作为文本库的去重键"""
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
 
 
 # ------------------------- 核心管理器 ------------------------ #
 class TextManager:
     """
-    加载 TXT → 清洗 → 切段 → 内存缓存。
-    若后续迁移数据库，只需把 self._store 换成 DAO（Data Access Object）即可。
+    加载 TXT → 清洗 → 切段 → 写入 TextDB。
+    文本按内容哈希去重并持久化：重启和多个 worker 之间 text_id 保持一致，
+    同一本书只在第一次加载时解码、清洗。
+    超大文件走惰性模式：只 mmap 并按需建立段落索引，第一页的耗时与文件大小无关。
     """
 
-    def __init__(self) -> None:
-        self._store: Dict[int, TextFile] = {}
-        self._next_id: int = 1
+    def __init__(
+        self,
+        db_path: str | Path | None = None,
+        lazy_threshold: int = LAZY_THRESHOLD,
+        page_cache_size: int = 256,
+        sentence_cache_size: int = 20000,
+    ) -> None:
+        self._db = TextDB(str(db_path or DEFAULT_DB_PATH))
+        self.lazy_threshold = lazy_threshold
+        self._lazy: Dict[int, LazyText] = {}
+        self._lazy_lock = threading.Lock()
+        # 惰性文本清洗后的页：(text_id, start_para, limit) → 段落列表
+        self._pages = LRUCache(maxsize=page_cache_size)
+        # 句子索引：(text_id, 段号) → ((start, end), ...)，用到哪段算哪段
+        self._sentences = LRUCache(maxsize=sentence_cache_size)
 
     # ---------- 公共 API ---------- #
-    def load_txt(self, file_path: str) -> TextFile:
+    def load_txt(
+        self,
+        file_path: str,
+        lazy: bool | None = None,
+        progress=no_progress,
+        executor=None,
+    ) -> TextFile:
         """
-        读取本地 TXT 并按段缓存，返回 TextFile 对象。
+        读取本地 TXT 并按段存入文本库，返回 TextFile 对象。
         自动处理常见编码误判（UTF-8 ↔ Windows-1252）。
+        路径、大小、修改时间都没变时只做一次 stat；内容已入库时只算一次哈希。
+        lazy 为 None 时按 lazy_threshold 自动选择；编码不支持惰性分段时退回整文件处理。
+        progress(**fields) 回报 stage / bytes_read / paragraphs_cleaned 等进度；
+        executor 为进程池时分块并行清洗。
         """
         p = Path(file_path).expanduser().resolve()
         if not p.exists() or not p.is_file():
             raise FileNotFoundError(f"找不到文件: {p}")
 
-        # (1) 读取字节并解码（包含多重回退）
-        raw_bytes = p.read_bytes()
-        text, encoding = self._decode_bytes(raw_bytes)
-
-        # (2) 统一换行符
-        text = text.replace("\r\n", "\n").replace("\r", "\n")
-
-        # (3) 按空行切段，然后按句子分割
-        raw_paras = re.split(r"\n\s*\n+", text)
-
-        # 进一步按句子分割
-                # 进一步按句子分割
-                # 进一步按句子分割
-        sentences = []
-        for para in raw_paras:
-            if para.strip():
-                # 按标点符号分割并保留标点
-                parts = re.split(r'([.!?]+)', para.strip())
-                current_sentence = ""
-                
-                for i, part in enumerate(parts):
-                    part = part.strip()
-                    if not part:
-                        continue
-                        
-                    if re.match(r'^[.!?]+$', part):  # 这是标点符号
-                        current_sentence += part
-                        if current_sentence.strip():
-                            sentences.append(current_sentence.strip())
-                        current_sentence = ""
-                    else:  # 这是文本内容
-                        current_sentence += part
-                
-                # 处理最后一个句子（如果没有标点结尾）
-                if current_sentence.strip():
-                    sentences.append(current_sentence.strip())
-
-        # (4) 清洗段落
-        paragraphs = [
-            self._clean_para(par) for par in raw_paras if par.strip()
-        ]
-
-        # (5) 缓存并返回
-        t = TextFile(
-            id=self._next_id,
-            title=p.stem,
-            path=p,
-            paragraphs=paragraphs,
-            encoding=encoding,
-        )
-        self._store[self._next_id] = t
-        self._next_id += 1
-        return t
+        # (0) 快速路径：同一文件未改动
+        st = p.stat()
+        progress(stage="checking", bytes_total=st.st_size)
+        text_id = self._db.find_by_path(str(p), st.st_size, st.st_mtime_ns)
+        if text_id is not None:
+            return self._text_file(text_id)
+
+        use_lazy = st.st_size >= self.lazy_threshold if lazy is None else lazy
+        if use_lazy:
+            text_id = self._load_lazy(p, st)
+            if text_id is not None:
+                self._db.remember_path(str(p), st.st_size, st.st_mtime_ns, text_id)
+                return self._text_file(text_id)
+
+        # (1) 读取字节；内容已入库则直接复用
+        progress(stage="reading", bytes_read=0)
+        raw_bytes = self._read_bytes(p, st.st_size, progress)
+        digest = content_hash(raw_bytes)
+        text_id = self._db.find_by_hash(digest)
+
+        if text_id is None:
+            # (2) 解码（包含多重回退）并统一换行符
+            progress(stage="decoding")
+            text, encoding = self._decode_bytes(raw_bytes)
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+
+            # (3) 按空行切段，记录每段在文本中的位置
+            raw_paras = []
+            pos = 0
+            for m in PARA_SPLIT_RE.finditer(text):
+                raw_paras.append((pos, m.start()))
+                pos = m.end()
+            raw_paras.append((pos, len(text)))
+
+            # (4) 清洗段落（分块批量，可并行）
+            spans = [(start, end) for start, end in raw_paras if text[start:end].strip()]
+            progress(stage="cleaning", paragraphs_total=len(spans), paragraphs_cleaned=0)
+            cleaned = map_chunks(
+                clean_paragraphs,
+                [text[start:end] for start, end in spans],
+                CLEAN_CHUNK,
+                executor,
+                lambda done: progress(paragraphs_cleaned=done),
+            )
+            paragraphs = [(start, end, c) for (start, end), c in zip(spans, cleaned)]
+
+            # (5) 入库
+            progress(stage="saving")
+            text_id = self._db.add_text(
+                digest, p.stem, str(p), encoding, len(raw_bytes), paragraphs
+            )
+
+        self._db.remember_path(str(p), st.st_size, st.st_mtime_ns, text_id)
+        return self._text_file(text_id)
 
     def list_all(self) -> List[Tuple[int, str]]:
         """返回 (id, title) 元组列表，供前端展示。"""
-        return [(t.id, t.title) for t in self._store.values()]
+        return self._db.list_texts()
 
     def get_slice(
         self, text_id: int, start_para: int = 0, limit: int = 50
     ) -> List[str]:
         """分页返回段落（前端可二次分页）。"""
-        t = self._store.get(text_id)
-        if not t:
+        t = self._db.get_text(text_id)
+        if t is None:
             raise KeyError(f"text_id={text_id} 未加载")
-        return t.paragraphs[start_para : start_para + limit]
+        if t["lazy"]:
+            return self._lazy_slice(t, start_para, limit)
+        return [row[3] for row in self._db.get_paragraphs(text_id, start_para, limit)]
+
+    def get_sentences(
+        self, text_id: int, start_para: int = 0, limit: int = 50
+    ) -> List[Dict]:
+        """
+        分页返回段落及其句子切分：[{"index", "text", "sentences": [[start, end], ...]}]，
+        start/end 为句子在段落 text 中的字符偏移。
+        """
+        paragraphs = self.get_slice(text_id, start_para, limit)
+        result = []
+        for index, para in enumerate(paragraphs, start_para):
+            key = (text_id, index)
+            spans = self._sentences.get(key)
+            if spans is None:
+                spans = sentence_spans(para)
+                self._sentences.put(key, spans)
+            result.append({"index": index, "text": para, "sentences": spans})
+        return result
 
     def info(self, text_id: int) -> Dict:
         """返回文本元信息。"""
-        t = self._store.get(text_id)
+        t = self._db.get_text(text_id)
         if not t:
             raise KeyError(f"text_id={text_id} 未加载")
         return {
-            "id": t.id,
-            "title": t.title,
-            "paragraphs": len(t.paragraphs),
-            "encoding": t.encoding,
-            "path": str(t.path),
+            "id": t["id"],
+            "title": t["title"],
+            "paragraphs": self._paragraph_count(t),  # 惰性文本未扫描完时为 None
+            "encoding": t["encoding"],
+            "path": t["path"],
+            "lazy": t["lazy"],
         }
 
+    def _text_file(self, text_id: int) -> TextFile:
+        t = self._db.get_text(text_id)
+        return TextFile(
+            id=t["id"],
+            title=t["title"],
+            path=Path(t["path"]),
+            paragraph_count=t["paragraph_count"],
+            encoding=t["encoding"],
+            content_hash=t["content_hash"],
+            lazy=t["lazy"],
+        )
+
+    # ---------- 惰性模式 ---------- #
+    def _load_lazy(self, p: Path, st) -> int | None:
+        """
+        惰性加载：只读文件头判断编码、采样计算指纹；编码不支持时返回 None。
+        采样指纹分辨不了同样大小、只改了未采样部分的文件，所以把路径和修改时间一起算进去：
+        文件一改就是新的 text_id，不会沿用旧记录和旧的页缓存。
+        """
+        with open(p, "rb") as f:
+            encoding = sniff_encoding(f.read(SNIFF_SIZE))
+        if encoding == "utf-8-sig":
+            encoding = "utf-8"  # BOM 当作普通字符读出，清洗时会被删掉（类别 Cf）
+        if not lazy_supported(encoding):
+            return None
+
+        lazy = LazyText(p, encoding)
+        digest = lazy.fingerprint(f"{p}\0{st.st_mtime_ns}".encode("utf-8", "surrogateescape"))
+        text_id = self._db.find_by_hash(digest)
+        if text_id is None:
+            text_id = self._db.add_text(
+                digest, p.stem, str(p), encoding, lazy.size, [], lazy=True
+            )
+        with self._lazy_lock:
+            old = self._lazy.pop(text_id, None)
+            self._lazy[text_id] = lazy
+        if old is not None:
+            old.close()
+            self._forget_pages(text_id)
+        return text_id
+
+    def _forget_pages(self, text_id: int):
+        """丢弃某个文本的页缓存和句子缓存（键的第一项都是 text_id）"""
+        self._pages.discard_where(lambda key: key[0] == text_id)
+        self._sentences.discard_where(lambda key: key[0] == text_id)
+
+    def _open_lazy(self, t: Dict) -> LazyText:
+        """本进程内复用同一个索引；重启或其他 worker 加载的文本在第一次访问时打开"""
+        with self._lazy_lock:
+            lazy = self._lazy.get(t["id"])
+            if lazy is None:
+                # 路径表里记录的是源文件当前大小和修改时间对应的 text_id；对不上说明文件改过
+                st = Path(t["path"]).stat()
+                if self._db.find_by_path(t["path"], st.st_size, st.st_mtime_ns) != t["id"]:
+                    raise KeyError(f"text_id={t['id']} 的源文件已变化，请重新加载")
+                lazy = self._lazy[t["id"]] = LazyText(t["path"], t["encoding"])
+            return lazy
+
+    def _lazy_slice(self, t: Dict, start_para: int, limit: int) -> List[str]:
+        """
+        从源文件按需解码、清洗一页；结果进页缓存。
+        单段解码用 errors="replace"：整文件没有预先校验，遇到坏字节不让整页失败。
+        """
+        key = (t["id"], start_para, limit)
+        page = self._pages.get(key)
+        if page is None:
+            lazy = self._open_lazy(t)
+            page = clean_paragraphs(
+                raw.decode(t["encoding"], errors="replace")
+                for raw in lazy.raw_paragraphs(start_para, limit)
+            )
+            self._pages.put(key, page)
+        return page
+
+    def _paragraph_count(self, t: Dict) -> int | None:
+        if t["paragraph_count"] is not None or not t["lazy"]:
+            return t["paragraph_count"]
+        lazy = self._open_lazy(t)
+        if not lazy.complete:
+            return None
+        count = lazy.indexed()
+        self._db.set_paragraph_count(t["id"], count)
+        return count
+
     # ---------- 私有工具 ---------- #
+    @staticmethod
+    def _read_bytes(p: Path, size: int, progress) -> bytearray:
+        """
+        按 stat 得到的大小一次分配缓冲区，分块 readinto 读满，每块回报一次 bytes_read。
+        直接返回 bytearray（哈希、解码都接受），不再复制成 bytes，峰值内存约为文件大小的一倍。
+        """
+        buf = bytearray(size)
+        view = memoryview(buf)
+        pos = 0
+        with open(p, "rb") as f:
+            while pos < size:
+                n = f.readinto(view[pos:pos + READ_CHUNK])
+                if not n:
+                    break
+                pos += n
+                progress(bytes_read=pos)
+            # 读的过程中文件被改动：变短则截掉，变长则补读剩下的
+            rest = f.read() if pos == size else b""
+        view.release()
+        del buf[pos:]
+        buf += rest
+        return buf
+
     @staticmethod
     def _decode_bytes(raw: bytes) -> Tuple[str, str]:
         """
         尝试多种策略解码字节流，返回 (文本, 编码名)。
-        优先 UTF-8；若失败则使用 chardet；置信度低或可能误判时回退 Windows-1252。
+        BOM → UTF-8 → 采样检测（必要时整文件检测）；置信度低或解码失败时回退 Windows-1252。
+        详见 encoding_services。
         """
-        # 1 最常见：UTF-8
-        try:
-            return raw.decode("utf-8"), "utf-8"
-        except UnicodeDecodeError:
-            pass
-
-        # 2 让 chardet 猜测
-        det = chardet.detect(raw)
-        enc = (det["encoding"] or "").lower()
-        conf = det.get("confidence", 0)
-
-        # chardet 在全英文文本里易把 UTF-8 误判成 Windows-1252/LATIN-1
-        if conf < 0.70 or enc in {"ascii", ""}:
-            enc = "windows-1252"
-
-        try:
-            return raw.decode(enc), enc
-        except UnicodeDecodeError:
-            # 3 最后兜底：宽容解码 Windows-1252
-            return raw.decode("windows-1252", errors="replace"), "windows-1252"
+        return decode_bytes(raw)
 
     @staticmethod
     def _clean_para(p: str) -> str:
@@ -155,15 +317,6 @@ class TextManager:
         1. 连续空白 → 1 空格
         2. 去控制字符
         3. 移除 Unicode 类别为 S* / C* 的符号与不可见字符（emoji、控制符等）
+        实现见 clean_services；批量场景直接用 clean_paragraphs。
         """
-        # 1. 折叠空白
-        p = re.sub(r"\s+", " ", p).strip()
-
-        # 2. 去控制字符 (ASCII 0–8, 11–31, 127)
-        p = re.sub(r"[\x00-\x08\x0B-\x1F\x7F]", "", p)
-
-        # 3. 过滤 Symbol (S) & Other (C) 类别字符
-        p = "".join(
-            ch for ch in p if not unicodedata.category(ch).startswith(("S", "C"))
-        )
-        return p
+        return clean_text(p)
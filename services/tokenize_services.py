@@ -0,0 +1,44 @@
+# backend/services/tokenize_services.py
+"""
+服务端分词：一条预编译正则扫描整段文本，只取字母词（可带内部撇号，如 don't / o’clock）。
+连字符、数字、下划线都视为分隔符，和客户端把连字符后断开的做法一致。
+"""
+import re
+import unicodedata
+from typing import Iterable, List, Tuple
+
+WORD_RE = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*")
+# 句子：到连续的 . ! ? 为止（标点算在句内）；段首孤立的标点自成一句
+SENTENCE_RE = re.compile(r"[^.!?\s][^.!?]*(?:[.!?]+|$)|[.!?]+")
+
+
+def word_key(token: str) -> str:
+    """
+    查词键，服务端唯一的单词归一化：分词结果、生词本的 word_norm 列都用它。
+    去首尾空白、NFC 规范化、Unicode 小写（与客户端 cleanWord 一致），弯撇号统一成直撇号。
+    """
+    token = token.strip()
+    if not token.isascii():
+        token = unicodedata.normalize("NFC", token).replace("’", "'")
+    return token.lower()
+
+
+def tokenize(text: str) -> List[Tuple[int, int, str]]:
+    """返回 [(start, end, key), ...]，start/end 为 text 中的字符下标"""
+    return [(m.start(), m.end(), word_key(m.group())) for m in WORD_RE.finditer(text)]
+
+
+def unique_keys(token_lists: Iterable[List[Tuple[int, int, str]]]) -> List[str]:
+    """多段分词结果里出现过的全部键（去重，保持首次出现顺序）"""
+    return list(dict.fromkeys(key for tokens in token_lists for _, _, key in tokens))
+
+
+def sentence_spans(text: str) -> Tuple[Tuple[int, int], ...]:
+    """句子在 text 中的 [start, end) 字符偏移，已去掉句尾空白"""
+    spans = []
+    for m in SENTENCE_RE.finditer(text):
+        start, end = m.span()
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        spans.append((start, end))
+    return tuple(spans)
@@ -1,8 +1,95 @@
 import os
-import sqlite3
+import gzip
+import threading
 import requests
 import hashlib
 import random
+from .db_pool_services import SQLitePool
+from .cache_services import LRUCache
+from .dict_snapshot_services import DictSnapshot, snapshot_path
+from .dict_suggest_services import SuggestIndex, suggest_index_path
+
+# 词典查询用到的列
+ENTRY_COLUMNS = "id, word, phonetic, definition, translation, exchange"
+# dict_build_services.build_nocase_index 建立的大小写无关索引
+NOCASE_INDEX_NAME = "stardict_word_nocase"
+
+NOCASE_QUERY = f"SELECT {ENTRY_COLUMNS} FROM stardict WHERE word = ? COLLATE NOCASE"
+EXACT_QUERY = f"SELECT {ENTRY_COLUMNS} FROM stardict WHERE word = ? LIMIT 1"
+
+# 单条 SQL 的绑定参数上限（旧版 SQLite 默认 999，留些余量）
+SQLITE_MAX_VARS = 900
+
+# NOCASE 只折叠 ASCII 字母，批量查询分组时用同样的规则
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def nocase_key(word: str) -> str:
+    """与 SQLite NOCASE 排序规则一致的比较键"""
+    return word.translate(_ASCII_LOWER)
+
+
+def fallback_keys(word: str) -> list:
+    """
+    NOCASE 不折叠非 ASCII 字母（"über" 查不到 "Über"）。word 含非 ASCII 字符时，
+    返回其余 case_variants 的 NOCASE 键（去重，不含 word 自己的），NOCASE 未命中时逐个补查。
+    """
+    if word.isascii():
+        return []
+    keys = [nocase_key(word)]
+    for v in case_variants(word):
+        key = nocase_key(v)
+        if key not in keys:
+            keys.append(key)
+    return keys[1:]
+
+
+def lemma_index_path(db_path: str) -> str:
+    """词形 → 原形索引文件（由 dict_build_services lemma-index 生成），与 en.db 放在一起"""
+    return os.path.splitext(db_path)[0] + ".lemma.tsv.gz"
+
+
+def load_lemma_index(path: str) -> dict:
+    """读取 "词形\t原形" 格式的压缩索引；文件不存在时返回空表（即不做原形回退）"""
+    if not os.path.isfile(path):
+        return {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return dict(line.rstrip("\n").split("\t", 1) for line in f if "\t" in line)
+
+
+def _is_thin(row) -> bool:
+    """未命中，或词条既无英文释义也无中文翻译"""
+    return row is None or not (row[3] or row[4])
+
+
+def case_variants(word: str) -> list:
+    """查询词的大小写变体，按优先级排列：原样 > 全小写 > 首字母大写 > 全大写"""
+    return [word, word.lower(), word.capitalize(), word.upper()]
+
+
+def case_rank(word: str, candidate: str) -> int:
+    """
+    同一个查询词命中多条（大小写不同）词条时的胜出规则：
+    按 case_variants 的顺序取第一个完全一致的，都不一致的排在最后。
+    """
+    try:
+        return case_variants(word).index(candidate)
+    except ValueError:
+        return 4
+
+
+def best_entry(word: str, rows):
+    """按 case_rank 从大小写无关匹配的多条词条中挑出胜者（同级取 id 小的）"""
+    if not rows:
+        return None
+    return min(rows, key=lambda r: (case_rank(word, r[1]), r[0]))
+
+
+def nocase_index_available(conn) -> bool:
+    """NOCASE 查询能否走索引（ECDICT 自带的 word 列若已是 NOCASE 也算）"""
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {NOCASE_QUERY}", ("",)).fetchall()
+    return any("USING" in row[-1] and "INDEX" in row[-1] for row in plan)
+
 
 class TranslationService:
     """翻译服务类，支持本地词典查询和句子翻译"""
@@ -10,50 +97,236 @@ class TranslationService:
     def __init__(self,
                  app_id="YOUR_APP_ID",
                  app_key="YOUR_APP_KEY",
-                 db_relative_path="../data/en.db"):
+                 db_relative_path="../data/en.db",
+                 cache_size=50000,
+                 cache_ttl=6 * 3600,
+                 engine="sqlite"):
         self.app_id = app_id
         self.app_key = app_key
         self.youdao_api_url = "https://openapi.youdao.com/api"
         base_dir = os.path.dirname(os.path.abspath(__file__))
         self.db_path = os.path.normpath(os.path.join(base_dir, db_relative_path))
+        # 每个工作线程一条只读长连接，查词时不再反复打开 en.db
+        self._pool = SQLitePool.read_only(self.db_path)
+        self._nocase_ready = None  # 首次查询时检测
+        # engine="snapshot" 时改用内存映射快照查词，多进程共享页缓存
+        self._snapshot = self._open_snapshot() if engine == "snapshot" else None
+        # 查词结果缓存（含未命中结果）；键为去掉首尾空白的原词，
+        # 不统一大小写是因为大小写会影响哪个词条胜出（见 case_rank）
+        self.cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self._lemmas = None  # 词形 → 原形，首次使用时加载
+        self._lemmas_lock = threading.Lock()  # 同时保护下面几个延迟加载的索引
+        self._suggest = None  # 补全/纠错索引，首次使用时打开
+
+    def _open_snapshot(self):
+        path = snapshot_path(self.db_path)
+        try:
+            return DictSnapshot(path)
+        except (OSError, ValueError) as e:
+            print(f"词典快照不可用，改用 SQLite 查询: {e}")
+            return None
 
     def lookup_word(self, word: str) -> dict:
         """从本地 SQLite 词典数据库查询单词释义"""
         word_raw = word.strip()
-        variants = [
-            word_raw,
-            word_raw.lower(),
-            word_raw.capitalize(),
-            word_raw.upper(),
-        ]
+        cached = self.cache.get(word_raw)
+        if cached is not None:
+            return dict(cached)
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            row = None
-            for w in variants:
-                cursor.execute(
-                    "SELECT id, word, phonetic, definition, translation, exchange "
-                    "FROM stardict WHERE word = ? LIMIT 1",
-                    (w,)
-                )
-                row = cursor.fetchone()
-                if row:
+            row = self._fetch_entry(word_raw)
+            lemma = self.lemma_of(word_raw, row)
+            lemma_row = self._fetch_entry(lemma) if lemma and _is_thin(row) else None
+            result = self._build_result(word_raw, row, lemma, lemma_row)
+        except Exception as e:
+            # 查询异常不缓存，下次重试
+            return {"error": f"⚠️ 查询失败：{str(e)}"}
+        self.cache.put(word_raw, result)
+        return dict(result)
+
+    def lookup_words(self, words) -> dict:
+        """
+        批量查词，返回 {原词: 与 lookup_word 相同结构的结果}。
+        先去重并查缓存，剩下的词在同一连接上合并成少量 IN 查询。
+        """
+        resolved = {}  # word_raw -> result
+        pending = []
+        for word_raw in dict.fromkeys(w.strip() for w in words):
+            cached = self.cache.get(word_raw)
+            if cached is not None:
+                resolved[word_raw] = cached
+            else:
+                pending.append(word_raw)
+
+        if pending:
+            try:
+                rows = self._fetch_entries(pending)
+                lemmas = {w: self.lemma_of(w, rows.get(w)) for w in pending}
+                lemma_rows = self._fetch_entries({
+                    lemma for w, lemma in lemmas.items() if lemma and _is_thin(rows.get(w))
+                })
+            except Exception as e:
+                error = {"error": f"⚠️ 查询失败：{str(e)}"}
+                for word_raw in pending:
+                    resolved[word_raw] = error
+            else:
+                for word_raw in pending:
+                    row = rows.get(word_raw)
+                    lemma = lemmas[word_raw]
+                    lemma_row = lemma_rows.get(lemma) if _is_thin(row) else None
+                    result = self._build_result(word_raw, row, lemma, lemma_row)
+                    self.cache.put(word_raw, result)
+                    resolved[word_raw] = result
+
+        return {word: dict(resolved[word.strip()]) for word in words}
+
+    def suggest(self, query: str, limit: int = 10) -> dict:
+        """前缀补全 + 编辑距离 ≤2 的拼写纠错，依赖 suggest-index 构建命令生成的索引"""
+        if self._suggest is None:
+            with self._lemmas_lock:
+                if self._suggest is None:
+                    try:
+                        self._suggest = SuggestIndex(suggest_index_path(self.db_path))
+                    except (OSError, ValueError) as e:
+                        return {"error": f"⚠️ 补全索引不可用：{str(e)}"}
+        key = nocase_key(query.strip())
+        return {
+            "prefix": self._suggest.prefix(key, limit),
+            "fuzzy": self._suggest.fuzzy(key, limit),
+        }
+
+    def lemma_of(self, word_raw: str, row=None) -> str | None:
+        """
+        根据 ECDICT exchange 字段预先倒排出的索引，返回屈折形式对应的原形；
+        词本身就是原形（或命中词条的 word 即原形）时返回 None。
+        """
+        if self._lemmas is None:
+            with self._lemmas_lock:
+                if self._lemmas is None:
+                    self._lemmas = load_lemma_index(lemma_index_path(self.db_path))
+        lemma = self._lemmas.get(word_raw.lower())
+        if lemma is None or (row is not None and nocase_key(row[1]) == nocase_key(lemma)):
+            return None
+        return lemma
+
+    def _build_result(self, word_raw: str, row, lemma, lemma_row) -> dict:
+        """
+        组装查词结果。词条缺失或过于简略时改用原形的词条；
+        只要知道原形就附带 "lemma" 字段，客户端不必再发起一次查询。
+        """
+        entry = lemma_row or row
+        if not entry:
+            return {"error": f"❌ 未找到定义：{word_raw}"}
+        result = self._format_entry(entry)
+        if lemma:
+            result["lemma"] = lemma_row[1] if lemma_row else lemma
+        return result
+
+    def _fetch_entry(self, word_raw: str):
+        """
+        取出与 word_raw 大小写无关匹配的最佳词条。
+        有 NOCASE 索引时一次查询取回全部大小写形式再按 case_rank 挑选，
+        非 ASCII 词未命中时再按 fallback_keys 补查；
+        没有索引（未运行过构建命令）时退回逐个变体精确查询。
+        """
+        if self._snapshot is not None:
+            candidates = self._snapshot.candidates
+        else:
+            conn = self._pool.connection()
+            if self._nocase_ready is None:
+                self._nocase_ready = nocase_index_available(conn)
+            if self._nocase_ready:
+                candidates = lambda key: conn.execute(NOCASE_QUERY, (key,)).fetchall()
+            else:
+                candidates = None
+
+        if candidates is not None:
+            rows = candidates(nocase_key(word_raw))
+            for key in fallback_keys(word_raw):
+                if rows:
                     break
-            conn.close()
+                rows = candidates(key)
+            return best_entry(word_raw, rows)
 
+        for w in case_variants(word_raw):
+            row = conn.execute(EXACT_QUERY, (w,)).fetchone()
             if row:
-                _, word_std, phonetic, definition, translation, exchange = row
-                return {
-                    "word":       word_std,
-                    "phonetic":   phonetic or "无",
-                    "definition": definition or "无",
-                    "translation": translation or "无",
-                    "exchange":    exchange or "无",
-                }
-            else:
-                return {"error": f"❌ 未找到定义：{word_raw}"}
-        except Exception as e:
-            return {"error": f"⚠️ 查询失败：{str(e)}"}
+                return row
+        return None
+
+    def _fetch_entries(self, words_raw) -> dict:
+        """_fetch_entry 的批量版本，返回 {word_raw: 最佳词条}，未命中的不在结果里"""
+        if not words_raw:
+            return {}
+        if self._snapshot is not None:
+            found = {}
+            for w in words_raw:
+                row = self._fetch_entry(w)
+                if row:
+                    found[w] = row
+            return found
+
+        conn = self._pool.connection()
+        if self._nocase_ready is None:
+            self._nocase_ready = nocase_index_available(conn)
+
+        if self._nocase_ready:
+            by_key = {}
+            self._fetch_nocase(conn, {nocase_key(w) for w in words_raw}, by_key)
+            # 非 ASCII 词 NOCASE 未命中的，再按 fallback_keys 补查一轮
+            missed = [w for w in words_raw if nocase_key(w) not in by_key]
+            self._fetch_nocase(conn, {k for w in missed for k in fallback_keys(w)}, by_key)
+            found = {}
+            for w in words_raw:
+                rows = by_key.get(nocase_key(w))
+                for key in fallback_keys(w):
+                    if rows:
+                        break
+                    rows = by_key.get(key)
+                row = best_entry(w, rows)
+                if row:
+                    found[w] = row
+            return found
+
+        variants = list({v for w in words_raw for v in case_variants(w)})
+        by_word = {}
+        for i in range(0, len(variants), SQLITE_MAX_VARS):
+            chunk = variants[i:i + SQLITE_MAX_VARS]
+            marks = ",".join("?" * len(chunk))
+            for row in conn.execute(
+                f"SELECT {ENTRY_COLUMNS} FROM stardict WHERE word IN ({marks})", chunk
+            ):
+                by_word.setdefault(row[1], row)
+        found = {}
+        for w in words_raw:
+            for v in case_variants(w):
+                if v in by_word:
+                    found[w] = by_word[v]
+                    break
+        return found
+
+    @staticmethod
+    def _fetch_nocase(conn, keys, by_key: dict):
+        """按 NOCASE 批量取词条，以 nocase_key 分组追加到 by_key"""
+        keys = list(keys)
+        for i in range(0, len(keys), SQLITE_MAX_VARS):
+            chunk = keys[i:i + SQLITE_MAX_VARS]
+            marks = ",".join("?" * len(chunk))
+            for row in conn.execute(
+                f"SELECT {ENTRY_COLUMNS} FROM stardict "
+                f"WHERE word COLLATE NOCASE IN ({marks})", chunk
+            ):
+                by_key.setdefault(nocase_key(row[1]), []).append(row)
+
+    @staticmethod
+    def _format_entry(row) -> dict:
+        _, word_std, phonetic, definition, translation, exchange = row
+        return {
+            "word":       word_std,
+            "phonetic":   phonetic or "无",
+            "definition": definition or "无",
+            "translation": translation or "无",
+            "exchange":    exchange or "无",
+        }
 
     def translate_sentence(self, text: str) -> str:
         """使用有道翻译 API（或模拟）翻译整个句子"""
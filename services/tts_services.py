@@ -71,6 +71,10 @@ class TTSService:
     # 句子间的静音长度(更短)
     SENTENCE_N_ZEROS = 2000  # 约0.08秒的静默
 
+    # 流式输出时每句单独编码成 MP3 再首尾相接：不写 ID3 标签和 Xing 头，
+    # 否则播放器会把第一句的 Xing 头当成整段音频的时长
+    STREAM_MP3_PARAMETERS = ["-write_xing", "0", "-id3v2_version", "0"]
+
     @classmethod
     async def get_instance(cls, cache_dir=None):
         """获取TTSService单例，确保模型只加载一次"""
@@ -159,8 +163,8 @@ class TTSService:
         text_hash = hashlib.md5(f"{text}_{lang}_{speed}".encode()).hexdigest()
         return os.path.join(self.cache_dir, f"{prefix}{text_hash}.mp3")
     
-    def _convert_wav_to_mp3(self, wav_data, sample_rate):
-        """将WAV音频数据转换为MP3格式"""
+    def _convert_wav_to_mp3(self, wav_data, sample_rate, parameters=None):
+        """将WAV音频数据转换为MP3格式；parameters 为额外的 ffmpeg 参数"""
         # 将numpy数组保存为WAV格式的内存数据
         wav_io = io.BytesIO()
         sf.write(wav_io, wav_data, sample_rate, format='WAV')
@@ -169,7 +173,7 @@ class TTSService:
         # 使用pydub转换为MP3
         audio_segment = AudioSegment.from_wav(wav_io)
         mp3_io = io.BytesIO()
-        audio_segment.export(mp3_io, format="mp3")
+        audio_segment.export(mp3_io, format="mp3", parameters=parameters)
         return mp3_io.getvalue()
 
     async def _run_in_executor(self, func, *args, **kwargs):
@@ -393,25 +397,11 @@ class TTSService:
             min_file_size=100
         )
 
-    async def speak(self, text, lang='en', speed=1.0, gender='female'):
+    def _prepare_speech(self, text, lang, speed, gender):
         """
-        文章/段落TTS服务 - 针对较长文本优化
-        
-        Args:
-            text: 要转换的文本
-            lang: 语言代码，支持的语言取决于LANGUAGE_CONFIG
-            speed: 语速倍率
-            gender: 声音性别，'female'或'male'
-            
-        Returns:
-            生成的音频文件路径，或者None(如果失败)
+        文章TTS的公共准备：统一换行、取语言配置、管道、声音和语速。
+        返回 (text, pipeline, voice, speed_callable, 缓存文件路径)，失败返回 None
         """
-        if not self._initialized:
-            await self.initialize()
-            
-        if not text:
-            return None
-        
         text = text.replace('\r\n', '\n').replace('\r', '\n')
         
         # 获取语言配置
@@ -435,23 +425,14 @@ class TTSService:
             
         # 使用语速参数获取缓存文件名    
         audio_file = self._get_audio_filename(text, lang, speed=speed_callable(100), is_word=False)
+        return text, pipeline, voice, speed_callable, audio_file
 
-        # 检查缓存
-        if os.path.exists(audio_file) and os.path.getsize(audio_file) >= 100:
-            return audio_file
-        
-        # ===== 改进的文本拆分处理 =====
-        
-        # 分割段落
-        paragraphs = text.split('\n\n')
-
-        debug_file = self._output_debug_text(paragraphs)
-        print(f"拆分调试信息已写入: {debug_file}")
-        
-        # 处理每个段落并合并
-        all_wavs = []
-        processed_chunks = 0
-        total_chunks = sum(1 for p in paragraphs if p.strip())
+    async def _synthesize_sentences(self, paragraphs, pipeline, voice, speed_callable):
+        """
+        逐句合成，每句完成后 yield 该句前的静默（段落间 / 句子间）与句子音频组成的列表。
+        合成失败或为空的句子跳过，不输出任何东西
+        """
+        produced = False
 
         for i, paragraph in enumerate(paragraphs):
             if not paragraph.strip():
@@ -459,20 +440,19 @@ class TTSService:
                 
             print(f"处理段落 {i+1}/{len(paragraphs)} (长度: {len(paragraph)}字符)")
             
-            # 添加段落间静默
-            if i > 0 and all_wavs and self.N_ZEROS > 0:
-                all_wavs.append(np.zeros(self.N_ZEROS))
+            # 段落间静默，挂在本段第一句前面
+            pending = []
+            if i > 0 and produced and self.N_ZEROS > 0:
+                pending.append(np.zeros(self.N_ZEROS))
             
             # 将段落拆分为句子
             sentences = self._split_text_into_sentences(paragraph)
             
             for j, sentence in enumerate(sentences):
-                processed_chunks += 1            
-                
                 # 句子间添加较短的静默
                 if j > 0:
-                    if all_wavs and self.SENTENCE_N_ZEROS > 0:
-                        all_wavs.append(np.zeros(self.SENTENCE_N_ZEROS))
+                    if produced and self.SENTENCE_N_ZEROS > 0:
+                        pending.append(np.zeros(self.SENTENCE_N_ZEROS))
                 
                 # 直接处理完整句子，不再拆分
                 try:
@@ -481,13 +461,129 @@ class TTSService:
                     wav_data = result.audio
                     
                     if wav_data is not None and hasattr(wav_data, 'shape') and len(wav_data.shape) > 0:
-                        all_wavs.append(wav_data)
+                        yield pending + [wav_data]
+                        pending = []
+                        produced = True
                     else:
                         print(f"  警告: 句子生成了空音频: '{sentence[:50]}...'")
                 except Exception as e:
                     print(f"  句子处理错误: '{sentence[:50]}...' - {e}")
                     continue
 
+    async def get_cached_speech(self, text, lang='en', speed=1.0, gender='female'):
+        """文章TTS已有缓存时返回音频文件路径，否则返回 None"""
+        if not self._initialized:
+            await self.initialize()
+        if not text:
+            return None
+        prepared = self._prepare_speech(text, lang, speed, gender)
+        if prepared is None:
+            return None
+        audio_file = prepared[-1]
+        if os.path.exists(audio_file) and os.path.getsize(audio_file) >= 100:
+            return audio_file
+        return None
+
+    async def speak_stream(self, text, lang='en', speed=1.0, gender='female'):
+        """
+        流式文章TTS：每合成完一句就编码成一段 MP3 并 yield，播放器收到第一句即可开始播放。
+        各段首尾相接就是完整的 MP3 流；全部完成后把整段写入缓存，
+        中途断开（生成器被关闭）时不写缓存。
+        
+        Args:
+            text: 要转换的文本
+            lang: 语言代码，支持的语言取决于LANGUAGE_CONFIG
+            speed: 语速倍率
+            gender: 声音性别，'female'或'male'
+            
+        Yields:
+            MP3 数据块（bytes）
+        """
+        if not self._initialized:
+            await self.initialize()
+            
+        if not text:
+            return
+        
+        prepared = self._prepare_speech(text, lang, speed, gender)
+        if prepared is None:
+            return
+        text, pipeline, voice, speed_callable, audio_file = prepared
+
+        # 已有缓存直接分块输出
+        if os.path.exists(audio_file) and os.path.getsize(audio_file) >= 100:
+            with open(audio_file, 'rb') as f:
+                while chunk := f.read(64 * 1024):
+                    yield chunk
+            return
+
+        chunks = []
+        async for wavs in self._synthesize_sentences(text.split('\n\n'), pipeline, voice, speed_callable):
+            mp3_data = await self._run_in_executor(
+                self._convert_wav_to_mp3, np.concatenate(wavs), self.SAMPLE_RATE,
+                self.STREAM_MP3_PARAMETERS
+            )
+            chunks.append(mp3_data)
+            yield mp3_data
+
+        if not chunks:
+            print("没有生成任何有效的音频片段")
+            return
+
+        # 写入缓存（先写临时文件再改名）
+        temp_file = f"{audio_file}.temp"
+        try:
+            with open(temp_file, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(temp_file, audio_file)
+            print(f"音频文件保存成功: {audio_file}")
+        except Exception as e:
+            print(f"音频保存错误: {e}")
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    async def speak(self, text, lang='en', speed=1.0, gender='female'):
+        """
+        文章/段落TTS服务 - 针对较长文本优化
+        
+        Args:
+            text: 要转换的文本
+            lang: 语言代码，支持的语言取决于LANGUAGE_CONFIG
+            speed: 语速倍率
+            gender: 声音性别，'female'或'male'
+            
+        Returns:
+            生成的音频文件路径，或者None(如果失败)
+        """
+        if not self._initialized:
+            await self.initialize()
+            
+        if not text:
+            return None
+        
+        prepared = self._prepare_speech(text, lang, speed, gender)
+        if prepared is None:
+            return None
+        text, pipeline, voice, speed_callable, audio_file = prepared
+
+        # 检查缓存
+        if os.path.exists(audio_file) and os.path.getsize(audio_file) >= 100:
+            return audio_file
+        
+        # ===== 改进的文本拆分处理 =====
+        
+        # 分割段落
+        paragraphs = text.split('\n\n')
+
+        debug_file = self._output_debug_text(paragraphs)
+        print(f"拆分调试信息已写入: {debug_file}")
+        
+        # 逐句合成并收集（含静默）
+        all_wavs = []
+        async for wavs in self._synthesize_sentences(paragraphs, pipeline, voice, speed_callable):
+            all_wavs.extend(wavs)
+
         # 检查是否有有效音频
         if not all_wavs:
             print("没有生成任何有效的音频片段")